@@ -116,6 +116,7 @@ import awesometts  # noqa, pylint:disable=wrong-import-position
 
 awesometts.browser_menus()     # mass generator and MP3 stripper
 awesometts.cache_control()     # automatically clear the media cache regularly
+awesometts.cache_warmer()      # prepare today's on-the-fly audio when idle
 awesometts.cards_button()      # on-the-fly templater helper in card view
 awesometts.config_menu()       # provides access to configuration dialog
 awesometts.editor_button()     # single audio clip generator button
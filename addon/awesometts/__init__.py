@@ -38,14 +38,16 @@ import aqt
 from . import conversion as to, gui, paths, service
 from .bundle import Bundle
 from .config import Config
+from .markup import outer_html
 from .player import Player
 from .router import Router
+from .store import Store
 from .text import Sanitizer
 from .updates import Updates
 
-__all__ = ['browser_menus', 'cards_button', 'config_menu', 'editor_button',
-           'reviewer_hooks', 'sound_tag_delays', 'update_checker',
-           'window_shortcuts']
+__all__ = ['browser_menus', 'cache_warmer', 'cards_button', 'config_menu',
+           'editor_button', 'reviewer_hooks', 'sound_tag_delays',
+           'update_checker', 'window_shortcuts']
 
 
 VERSION = '1.9.0-dev'
@@ -61,7 +63,9 @@ AGENT = 'AwesomeTTS/%s (Anki %s; PyQt %s; %s %s; %s)' % (
 # Begin core class initialization and dependency setup, pylint:disable=C0103
 
 logger = Bundle(debug=lambda *a, **k: None, error=lambda *a, **k: None,
-                info=lambda *a, **k: None, warn=lambda *a, **k: None)
+                info=lambda *a, **k: None, warn=lambda *a, **k: None,
+                disabled=True)
+# (n.b. `disabled` lets components skip preparing debug-only details)
 # for logging output, replace `logger` with a real one, e.g.:
 # import logging as logger
 # logger.basicConfig(stream=sys.stdout, level=logger.DEBUG)
@@ -80,12 +84,12 @@ config = Config(
         ('automaticQuestions', 'integer', True, to.lax_bool, int),
         ('automatic_questions_errors', 'integer', True, to.lax_bool, int),
         ('cache_days', 'integer', 70, int, int),
-        ('delay_answers_onthefly', 'integer', 0, int, int),
-        ('delay_answers_stored_ours', 'integer', 0, int, int),
-        ('delay_answers_stored_theirs', 'integer', 0, int, int),
-        ('delay_questions_onthefly', 'integer', 0, int, int),
-        ('delay_questions_stored_ours', 'integer', 0, int, int),
-        ('delay_questions_stored_theirs', 'integer', 0, int, int),
+        ('delay_answers_onthefly', 'real', 0, float, float),
+        ('delay_answers_stored_ours', 'real', 0, float, float),
+        ('delay_answers_stored_theirs', 'real', 0, float, float),
+        ('delay_questions_onthefly', 'real', 0, float, float),
+        ('delay_questions_stored_ours', 'real', 0, float, float),
+        ('delay_questions_stored_theirs', 'real', 0, float, float),
         ('ellip_note_newlines', 'integer', False, to.lax_bool, int),
         ('ellip_template_newlines', 'integer', False, to.lax_bool, int),
         ('extras', 'text', {}, to.deserialized_dict, to.compact_json),
@@ -97,6 +101,7 @@ config = Config(
         ('last_mass_append', 'integer', True, to.lax_bool, int),
         ('last_mass_behavior', 'integer', True, to.lax_bool, int),
         ('last_mass_dest', 'text', 'Back', unicode, unicode),
+        ('last_mass_incremental', 'integer', False, to.lax_bool, int),
         ('last_mass_source', 'text', 'Front', unicode, unicode),
         ('last_options', 'text', {}, to.deserialized_dict, to.compact_json),
         ('last_service', 'text', ('sapi5' if 'win32' in sys.platform
@@ -114,6 +119,7 @@ config = Config(
         ('launch_templater', 'integer', Qt.ControlModifier | Qt.Key_T,
          to.nullable_key, to.nullable_int),
         ('otf_only_revealed_cloze', 'integer', False, to.lax_bool, int),
+        ('otf_prefetch_cards', 'integer', 2, int, int),
         ('otf_remove_hints', 'integer', False, to.lax_bool, int),
         ('presets', 'text', {}, to.deserialized_dict, to.compact_json),
         ('spec_note_count', 'text', '', unicode, unicode),
@@ -146,12 +152,27 @@ config = Config(
         ('updates_enabled', 'integer', True, to.lax_bool, int),
         ('updates_ignore', 'text', '', str, str),
         ('updates_postpone', 'integer', 0, int, lambda i: int(round(i))),
+        ('warm_ac_only', 'integer', True, to.lax_bool, int),
+        ('warm_day', 'integer', 0, int, int),
+        ('warm_done', 'integer', 0, int, int),
+        ('warm_enabled', 'integer', False, to.lax_bool, int),
+        ('warm_hour_end', 'integer', 0, int, int),
+        ('warm_hour_start', 'integer', 0, int, int),
+        ('warm_idle_minutes', 'integer', 5, int, int),
+        ('warm_last_id', 'integer', 0, int, int),
+        ('warm_total', 'integer', 0, int, int),
     ],
     logger=logger,
     events=[
     ],
 )
 
+store = Store(
+    db=Bundle(path=paths.CONFIG,
+              table='records'),
+    logger=logger,
+)
+
 player = Player(
     anki=Bundle(
         mw=aqt.mw,
@@ -159,6 +180,7 @@ player = Player(
         sound=anki.sound,  # for accessing queue member, which is not wrapped
     ),
     blank=paths.BLANK,
+    cache=paths.CACHE,
     config=config,
     logger=logger,
 )
@@ -213,12 +235,14 @@ router = Router(
                     lame_flags=lambda: config['lame_flags'],
                     normalize=to.normalized_ascii,
                     logger=logger,
-                    ecosystem=Bundle(web=WEB, agent=AGENT)),
+                    ecosystem=Bundle(web=WEB, agent=AGENT),
+                    store=store),
     ),
     cache_dir=paths.CACHE,
     temp_dir=join(paths.TEMP, '_awesometts_scratch_' + str(int(time()))),
     logger=logger,
     config=config,
+    store=store,
 )
 
 updates = Updates(
@@ -356,11 +380,19 @@ addon = Bundle(
             univ=Sanitizer(rules=['sounds_univ', 'filenames'], logger=logger),
         ),
     ),
+    # fast lookups of specific elements in HTML (e.g. on-the-fly <tts> tags)
+    tags=Bundle(tts=lambda html: outer_html(html, 'tts', nestable=True)),
     updates=updates,
     version=VERSION,
     web=WEB,
 )
 
+# shared by on-the-fly playback and the cache warmer, e.g. so that they use
+# the same cache of tags extracted from cards
+reviewer = gui.Reviewer(addon=addon,
+                        alerts=aqt.utils.showWarning,
+                        mw=aqt.mw)
+
 # End core class initialization and dependency setup, pylint:enable=C0103
 
 
@@ -472,6 +504,21 @@ def cache_control():
                 pass
 
     anki.hooks.addHook('unloadProfile', on_unload_profile)
+    anki.hooks.addHook('unloadProfile', router.save_misses)
+
+
+def cache_warmer():
+    """
+    Prepares the on-the-fly audio for today's due cards in the
+    background whenever Anki has been idle long enough, if enabled.
+    """
+
+    warmer = gui.Warmer(addon=addon, reviewer=reviewer, mw=aqt.mw)
+
+    # any reviewer activity pauses warming until the next idle period
+
+    anki.hooks.addHook('showQuestion', warmer.poke)
+    anki.hooks.addHook('showAnswer', warmer.poke)
 
 
 def cards_button():
@@ -581,10 +628,6 @@ def reviewer_hooks():
     from PyQt4.QtCore import QEvent
     from PyQt4.QtGui import QMenu
 
-    reviewer = gui.Reviewer(addon=addon,
-                            alerts=aqt.utils.showWarning,
-                            mw=aqt.mw)
-
     # automatic playback
 
     anki.hooks.addHook(
@@ -44,6 +44,8 @@ from .updater import Updater
 
 from .reviewer import Reviewer
 
+from .warmer import Warmer
+
 __all__ = [
     # common
     'Action',
@@ -61,4 +63,5 @@ __all__ = [
 
     # headless
     'Reviewer',
+    'Warmer',
 ]
@@ -812,9 +812,12 @@ class ServiceDialog(Dialog):
         self._disable_inputs()
 
         text_value = self._addon.strip.from_user(text_value)
+        parts = []  # paths of the segments played as they became ready
         callbacks = dict(
             done=lambda: self._disable_inputs(False),
-            okay=self._addon.player.preview,
+            part=lambda path: (parts.append(path),
+                               self._addon.player.preview(path)),
+            okay=lambda path: parts or self._addon.player.preview(path),
             fail=lambda exception: self._alerts(
                 "Cannot preview the input phrase with these settings.\n\n%s" %
                 exception.message,
@@ -52,18 +52,21 @@ class Configurator(Dialog):
         'ellip_template_newlines', 'filenames', 'filenames_human',
         'lame_flags', 'launch_browser_generator', 'launch_browser_stripper',
         'launch_configurator', 'launch_editor_generator', 'launch_templater',
-        'otf_only_revealed_cloze', 'otf_remove_hints', 'spec_note_strip',
-        'spec_note_ellipsize', 'spec_template_ellipsize', 'spec_note_count',
-        'spec_note_count_wrap', 'spec_template_count',
+        'otf_only_revealed_cloze', 'otf_prefetch_cards', 'otf_remove_hints',
+        'spec_note_strip', 'spec_note_ellipsize', 'spec_template_ellipsize',
+        'spec_note_count', 'spec_note_count_wrap', 'spec_template_count',
         'spec_template_count_wrap', 'spec_template_strip', 'strip_note_braces',
         'strip_note_brackets', 'strip_note_parens', 'strip_template_braces',
         'strip_template_brackets', 'strip_template_parens', 'sub_note_cloze',
         'sub_template_cloze', 'sul_note', 'sul_template', 'throttle_sleep',
         'throttle_threshold', 'tts_key_a', 'tts_key_q', 'updates_enabled',
+        'warm_ac_only', 'warm_enabled', 'warm_hour_end', 'warm_hour_start',
+        'warm_idle_minutes',
     ]
 
     _PROPERTY_WIDGETS = (Checkbox, QtGui.QComboBox, QtGui.QLineEdit,
-                         QtGui.QPushButton, QtGui.QSpinBox, QtGui.QListView)
+                         QtGui.QPushButton, QtGui.QSpinBox,
+                         QtGui.QDoubleSpinBox, QtGui.QListView)
 
     __slots__ = ['_alerts', '_ask', '_preset_editor', '_group_editor',
                  '_sul_compiler']
@@ -123,6 +126,7 @@ class Configurator(Dialog):
             'automatic_answers', 'tts_key_a',
             'delay_answers_', "Answers / Backs of Cards",
         ))
+        vert.addLayout(self._ui_tabs_playback_prefetch())
         vert.addSpacing(self._SPACING)
         vert.addWidget(Label('Anki controls if and how to play [sound] '
                              'tags. See "Help" for more information.'))
@@ -132,6 +136,24 @@ class Configurator(Dialog):
         tab.setLayout(vert)
         return tab
 
+    def _ui_tabs_playback_prefetch(self):
+        """
+        Returns the input for how many upcoming cards should have their
+        on-the-fly audio prepared ahead of time.
+        """
+
+        spinner = QtGui.QSpinBox()
+        spinner.setObjectName('otf_prefetch_cards')
+        spinner.setRange(0, 10)
+        spinner.setSingleStep(1)
+        spinner.setSuffix(" cards")
+
+        hor = QtGui.QHBoxLayout()
+        hor.addWidget(Label("Prepare on-the-fly audio early for the next"))
+        hor.addWidget(spinner)
+        hor.addStretch()
+        return hor
+
     def _ui_tabs_playback_group(self, automatic_key, shortcut_key,
                                 delay_key_prefix, label):
         """
@@ -154,10 +176,11 @@ class Configurator(Dialog):
         for subkey, desc in [('onthefly', "on-the-fly <tts> tags"),
                              ('stored_ours', "AwesomeTTS [sound] tags"),
                              ('stored_theirs', "other [sound] tags")]:
-            spinner = QtGui.QSpinBox()
+            spinner = QtGui.QDoubleSpinBox()
             spinner.setObjectName(delay_key_prefix + subkey)
             spinner.setRange(0, 30)
-            spinner.setSingleStep(1)
+            spinner.setDecimals(2)
+            spinner.setSingleStep(0.25)
             spinner.setSuffix(" seconds")
             wait_widgets[subkey] = spinner
 
@@ -489,6 +512,7 @@ class Configurator(Dialog):
         layout.addWidget(self._ui_tabs_advanced_presets())
         layout.addWidget(self._ui_tabs_advanced_update())
         layout.addWidget(self._ui_tabs_advanced_cache())
+        layout.addWidget(self._ui_tabs_advanced_warm())
         layout.addStretch()
 
         tab = QtGui.QWidget()
@@ -560,7 +584,9 @@ class Configurator(Dialog):
         layout = QtGui.QVBoxLayout()
         layout.addWidget(Note("AwesomeTTS caches generated audio files and "
                               "remembers failures during each session to "
-                              "speed up repeated playback."))
+                              "speed up repeated playback. Words that "
+                              "dictionary services do not have are "
+                              "remembered for a month."))
         layout.addLayout(hor)
 
         abutton = QtGui.QPushButton("Delete Files")
@@ -571,15 +597,66 @@ class Configurator(Dialog):
         fbutton.setObjectName('on_forget')
         fbutton.clicked.connect(lambda: self._on_forget_failures(fbutton))
 
+        mbutton = QtGui.QPushButton("Forget Missing Words")
+        mbutton.setObjectName('on_forget_misses')
+        mbutton.clicked.connect(lambda: self._on_forget_misses(mbutton))
+
         hor = QtGui.QHBoxLayout()
         hor.addWidget(abutton)
         hor.addWidget(fbutton)
+        hor.addWidget(mbutton)
         layout.addLayout(hor)
 
+        stats = Note()
+        stats.setObjectName('text_cache_stats')
+        layout.addWidget(stats)
+
         group = QtGui.QGroupBox("Caching")
         group.setLayout(layout)
         return group
 
+    def _ui_tabs_advanced_warm(self):
+        """Returns the "Idle Warm-Up" input group."""
+
+        minutes = QtGui.QSpinBox()
+        minutes.setObjectName('warm_idle_minutes')
+        minutes.setRange(1, 240)
+        minutes.setSuffix(" min")
+
+        hor = QtGui.QHBoxLayout()
+        hor.addWidget(Label("Start after"))
+        hor.addWidget(minutes)
+        hor.addWidget(Label("without reviewing, between"))
+
+        for object_name in ['warm_hour_start', 'warm_hour_end']:
+            hour = QtGui.QSpinBox()
+            hour.setObjectName(object_name)
+            hour.setRange(0, 23)
+            hour.setSuffix(":00")
+            if object_name == 'warm_hour_end':
+                hor.addWidget(Label("and"))
+            hor.addWidget(hour)
+
+        hor.addStretch()
+
+        progress = Note()
+        progress.setObjectName('warm_progress')
+
+        layout = QtGui.QVBoxLayout()
+        layout.addWidget(Checkbox("Prepare on-the-fly audio for today's due "
+                                  "cards while Anki is idle", 'warm_enabled'))
+        layout.addLayout(hor)
+        layout.addWidget(Checkbox("only while the computer is plugged in",
+                                  'warm_ac_only'))
+        layout.addWidget(Note("Use the same start and end hour to allow any "
+                              "time of day. Download throttling from the "
+                              "MP3s tab also applies."))
+        layout.addWidget(progress)
+
+        group = QtGui.QGroupBox("Idle Warm-Up")
+        group.setLayout(layout)
+        return group
+
     # Factories ##############################################################
 
     def _factory_shortcut(self, object_name):
@@ -618,7 +695,7 @@ class Configurator(Dialog):
                 widget.setText(key_combo_desc(widget.atts_value))
             elif isinstance(widget, QtGui.QComboBox):
                 widget.setCurrentIndex(max(widget.findData(value), 0))
-            elif isinstance(widget, QtGui.QSpinBox):
+            elif isinstance(widget, (QtGui.QSpinBox, QtGui.QDoubleSpinBox)):
                 widget.setValue(value)
             elif isinstance(widget, QtGui.QListView):
                 widget.setModel(value)
@@ -646,6 +723,39 @@ class Configurator(Dialog):
             widget.setEnabled(False)
             widget.setText("Forget Failures")
 
+        widget = self.findChild(QtGui.QPushButton, 'on_forget_misses')
+        miss_count = self._addon.router.get_miss_count()
+        if miss_count:
+            widget.setEnabled(True)
+            widget.setText("Forget Missing Words (%s)" %
+                           locale("%d", miss_count, grouping=True))
+        else:
+            widget.setEnabled(False)
+            widget.setText("Forget Missing Words")
+
+        strip = self._addon.strip
+        hits = misses = 0
+        for sanitizer in [strip.from_note, strip.from_template_front,
+                          strip.from_template_back, strip.from_unknown,
+                          strip.from_user]:
+            stats = sanitizer.get_stats()
+            hits += stats['hits']
+            misses += stats['misses']
+        self.findChild(Note, 'text_cache_stats').setText(
+            "Text cleanup this session: %s answered from cache, %s "
+            "processed" % (locale("%d", hits, grouping=True),
+                           locale("%d", misses, grouping=True))
+        )
+
+        config = self._addon.config
+        self.findChild(Note, 'warm_progress').setText(
+            "Most recent warm-up: %s of %s due cards prepared" % (
+                locale("%d", config['warm_done'], grouping=True),
+                locale("%d", config['warm_total'], grouping=True),
+            ) if config['warm_total']
+            else "No cards have been prepared yet."
+        )
+
         super(Configurator, self).show(*args, **kwargs)
 
     def accept(self):
@@ -659,7 +769,8 @@ class Configurator(Dialog):
             widget.objectName(): (
                 widget.isChecked() if isinstance(widget, Checkbox)
                 else widget.atts_value if isinstance(widget, QtGui.QPushButton)
-                else widget.value() if isinstance(widget, QtGui.QSpinBox)
+                else widget.value() if isinstance(widget, (
+                    QtGui.QSpinBox, QtGui.QDoubleSpinBox))
                 else widget.itemData(widget.currentIndex()) if isinstance(
                     widget, QtGui.QComboBox)
                 else [
@@ -820,3 +931,10 @@ class Configurator(Dialog):
         button.setEnabled(False)
         self._addon.router.forget_failures()
         button.setText("forgot failures")
+
+    def _on_forget_misses(self, button):
+        """Tells the router to forget all known missing words."""
+
+        button.setEnabled(False)
+        self._addon.router.forget_misses()
+        button.setText("forgot missing words")
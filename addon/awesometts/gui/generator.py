@@ -23,9 +23,16 @@
 File generation dialogs
 """
 
+from collections import deque
+from itertools import izip
+from locale import format as locale
+import os.path
 from re import compile as re
 from PyQt4 import QtCore, QtGui
 
+from anki.utils import ids2str
+
+from ..text import RE_SOUNDS
 from .base import Dialog, ServiceDialog
 from .common import Checkbox, Label, Note
 
@@ -42,11 +49,17 @@ class BrowserGenerator(ServiceDialog):
 
     HELP_USAGE_SLUG = 'browser'
 
+    INCREMENTAL_BATCH = 100  # up-to-date notes skipped per event loop pass
+
+    LOAD_CHUNK = 100  # number of notes loaded from the collection at a time
+
+    _RE_MEDIA_NAME = re(r'^(.+?)( \(\d+\))?\.mp3$')
+
     _RE_WHITESPACE = re(r'\s+')
 
     __slots__ = [
         '_browser',  # reference to the current Anki browser window
-        '_notes',    # list of Note objects selected when window opened
+        '_notes',    # list of (note ID, model ID) selected when window opened
         '_process',  # state during processing; see accept() method below
     ]
 
@@ -85,6 +98,7 @@ class BrowserGenerator(ServiceDialog):
         layout.addStretch()
         layout.addLayout(self._ui_control_fields())
         layout.addWidget(self._ui_control_handling())
+        layout.addLayout(self._ui_control_estimate())
         layout.addStretch()
         layout.addWidget(self._ui_buttons())
 
@@ -121,7 +135,8 @@ class BrowserGenerator(ServiceDialog):
 
     def _ui_control_handling(self):
         """
-        Return the append/overwrite radio buttons and behavior checkbox.
+        Return the append/overwrite radio buttons, behavior checkbox,
+        and incremental mode checkbox.
         """
 
         append = QtGui.QRadioButton(
@@ -141,17 +156,47 @@ class BrowserGenerator(ServiceDialog):
             lambda status: self._on_behavior_changed(),
         )
 
+        incremental = Checkbox("&Skip Notes Whose Audio Is Already Up-to-Date",
+                               'incremental')
+        incremental.setToolTip(
+            "Notes whose destination field already has the exact file "
+            "that the current source text and service settings would "
+            "produce are left alone. This only works if you use the "
+            "default hashed filenames."
+        )
+
         layout = QtGui.QVBoxLayout()
         layout.addWidget(append)
         layout.addWidget(overwrite)
         layout.addSpacing(self._SPACING)
         layout.addWidget(behavior)
+        layout.addWidget(incremental)
 
         widget = QtGui.QWidget()
         widget.setLayout(layout)
 
         return widget
 
+    def _ui_control_estimate(self):
+        """
+        Returns a horizontal layout with a button to run a dry run of
+        the batch and a note where its results are displayed.
+        """
+
+        button = QtGui.QPushButton("&Estimate")
+        button.setObjectName('estimate_button')
+        button.clicked.connect(self._on_estimate)
+
+        estimate = Note()  # see _on_estimate() for where this gets filled
+        estimate.setObjectName('estimate')
+        estimate.setFont(self._FONT_INFO)
+
+        layout = QtGui.QHBoxLayout()
+        layout.addWidget(button)
+        layout.addWidget(estimate, 1)
+
+        return layout
+
     def _ui_buttons(self):
         """
         Adjust title of the OK button.
@@ -174,9 +219,17 @@ class BrowserGenerator(ServiceDialog):
         window.
         """
 
+        # Only the note IDs and their note types are looked up here, with
+        # the notes themselves being loaded in chunks during processing, so
+        # that opening the window is cheap regardless of the selection size.
+        note_ids = self._browser.selectedNotes()
+        mids = dict(self._browser.mw.col.db.all(
+            'select id, mid from notes where id in %s' % ids2str(note_ids)
+        ))
         self._notes = [
-            self._browser.mw.col.getNote(note_id)
-            for note_id in self._browser.selectedNotes()
+            (note_id, mids[note_id])
+            for note_id in note_ids
+            if note_id in mids
         ]
 
         self.findChild(Note, 'intro').setText(
@@ -184,10 +237,11 @@ class BrowserGenerator(ServiceDialog):
             (len(self._notes), "s" if len(self._notes) != 1 else "")
         )
 
+        models = self._browser.mw.col.models
         fields = sorted({
-            field
-            for note in self._notes
-            for field in note.keys()
+            field['name']
+            for mid in set(mids.values())
+            for field in models.get(mid)['flds']
         })
 
         config = self._addon.config
@@ -216,6 +270,14 @@ class BrowserGenerator(ServiceDialog):
         self.findChild(Checkbox, 'behavior') \
             .setChecked(config['last_mass_behavior'])
 
+        self.findChild(Checkbox, 'incremental') \
+            .setChecked(config['last_mass_incremental'])
+
+        self.findChild(Note, 'estimate').setText(
+            "Click to see how much of this batch is already cached and "
+            "roughly how long the rest will take."
+        )
+
         super(BrowserGenerator, self).show(*args, **kwargs)
 
         source.setFocus()
@@ -229,16 +291,10 @@ class BrowserGenerator(ServiceDialog):
         now = self._get_all()
         source = now['last_mass_source']
         dest = now['last_mass_dest']
-        append = now['last_mass_append']
-        behavior = now['last_mass_behavior']
 
-        eligible_notes = [
-            note
-            for note in self._notes
-            if source in note.keys() and dest in note.keys()
-        ]
+        eligible_ids = self._get_eligible(source, dest)
 
-        if not eligible_notes:
+        if not eligible_ids:
             self._alerts(
                 "Of the %d notes selected in the browser, none have both "
                 "'%s' and '%s' fields." % (len(self._notes), source, dest)
@@ -259,7 +315,7 @@ class BrowserGenerator(ServiceDialog):
             'all': now,
             'aborted': False,
             'progress': _Progress(
-                maximum=len(eligible_notes),
+                maximum=len(eligible_ids),
                 on_cancel=self._accept_abort,
                 title="Generating MP3s",
                 addon=self._addon,
@@ -273,16 +329,15 @@ class BrowserGenerator(ServiceDialog):
                 'source': source,
                 'dest': dest,
             },
-            'handling': {
-                'append': append,
-                'behavior': behavior,
-            },
-            'queue': eligible_notes,
+            'handling': self._get_handling(now),
+            'queue': deque(eligible_ids),  # note IDs not yet loaded
+            'loaded': deque(),  # chunk of (Note, phrase) ready to process
             'counts': {
                 'total': len(self._notes),
-                'elig': len(eligible_notes),
-                'skip': len(self._notes) - len(eligible_notes),
+                'elig': len(eligible_ids),
+                'skip': len(self._notes) - len(eligible_ids),
                 'done': 0,  # all notes processed
+                'current': 0,  # notes whose audio was already up-to-date
                 'okay': 0,  # calls which resulted in a successful MP3
                 'fail': 0,  # calls which resulted in an exception
             },
@@ -317,7 +372,7 @@ class BrowserGenerator(ServiceDialog):
         proc = self._process
         throttling = proc['throttling']
 
-        if proc['aborted'] or not proc['queue']:
+        if proc['aborted'] or not (proc['loaded'] or proc['queue']):
             self._accept_done()
             return
 
@@ -334,9 +389,29 @@ class BrowserGenerator(ServiceDialog):
             timer.start()
             return
 
-        note = proc['queue'].pop(0)
-        phrase = note[proc['fields']['source']]
-        phrase = self._addon.strip.from_note(phrase)
+        current = 0
+
+        while True:
+            note, phrase = self._accept_next_note()
+
+            if not (proc['handling']['incremental'] and
+                    self._is_current(note, phrase, proc['service'],
+                                     proc['fields']['dest'],
+                                     proc['handling'])):
+                break
+
+            proc['counts']['done'] += 1
+            proc['counts']['current'] += 1
+            current += 1
+
+            # Up-to-date notes need no synthesis or flush, so several are
+            # skipped per pass, yielding back to the event loop once in a
+            # while so that the progress and cancel button stay responsive.
+            if not (proc['loaded'] or proc['queue']) or \
+                    current >= self.INCREMENTAL_BATCH:
+                QtCore.QTimer.singleShot(0, self._accept_next)
+                return
+
         self._accept_update(phrase)
 
         def done():
@@ -349,7 +424,8 @@ class BrowserGenerator(ServiceDialog):
 
             filename = self._browser.mw.col.media.addFile(path)
             dest = proc['fields']['dest']
-            note[dest] = self._accept_next_output(note[dest], filename)
+            note[dest] = self._get_output(note[dest], filename,
+                                          proc['handling'])
             proc['counts']['okay'] += 1
             note.flush()
 
@@ -405,16 +481,81 @@ class BrowserGenerator(ServiceDialog):
                                want_human=want_human,
                                note=note)
 
-    def _accept_next_output(self, old_value, filename):
+    def _accept_next_note(self):
         """
-        Given a note's old value and our current handling options,
-        returns a new note value using the passed filename.
+        Returns the next note to be processed and its sanitized source
+        phrase, loading (and sanitizing) another chunk of them from the
+        collection if needed.
         """
 
         proc = self._process
 
-        if proc['handling']['append']:
-            if proc['handling']['behavior']:
+        if not proc['loaded']:
+            get_note = self._browser.mw.col.getNote
+            queue = proc['queue']
+            source = proc['fields']['source']
+            notes = [get_note(queue.popleft())
+                     for _ in range(min(self.LOAD_CHUNK, len(queue)))]
+            proc['loaded'].extend(izip(
+                notes,
+                self._addon.strip.from_note.batch(note[source]
+                                                  for note in notes),
+            ))
+
+        return proc['loaded'].popleft()
+
+    def _is_current(self, note, phrase, service, dest, handling):
+        """
+        Returns True if the note's destination field already refers to
+        the exact file that the given service settings would produce
+        for the phrase, such that regenerating the note would not change
+        it. Returns False otherwise, including if it cannot be told.
+        """
+
+        router = self._addon.router
+        svc_id = service['id']
+
+        try:
+            if svc_id.startswith('group:'):
+                config = self._addon.config
+                path = router.get_group_path(
+                    text=phrase,
+                    group=config['groups'][svc_id[6:]],
+                    presets=config['presets'],
+                )
+            else:
+                path = router.get_path(svc_id, phrase, service['options'])
+        except Exception:  # catch all, pylint:disable=broad-except
+            return False
+
+        if not path:
+            return False
+        expected = os.path.splitext(os.path.basename(path))[0]
+
+        old_value = note[dest]
+        media_dir = self._browser.mw.col.media.dir()
+
+        for filename in RE_SOUNDS.findall(old_value) + \
+                [old_value.strip()]:
+            match = self._RE_MEDIA_NAME.match(filename)
+            if (
+                    match and match.group(1) == expected and
+                    os.path.exists(os.path.join(media_dir, filename)) and
+                    self._get_output(old_value, filename,
+                                     handling).strip() == old_value.strip()
+            ):
+                return True
+
+        return False
+
+    def _get_output(self, old_value, filename, handling):
+        """
+        Given a note's old value and the handling options, returns a new
+        note value using the passed filename.
+        """
+
+        if handling['append']:
+            if handling['behavior']:
                 return self._addon.strip.sounds.univ(old_value).strip() + \
                     ' [sound:%s]' % filename
             elif filename in old_value:
@@ -423,7 +564,7 @@ class BrowserGenerator(ServiceDialog):
                 return old_value + ' [sound:%s]' % filename
 
         else:
-            if proc['handling']['behavior']:
+            if handling['behavior']:
                 return '[sound:%s]' % filename
             else:
                 return filename
@@ -459,7 +600,7 @@ class BrowserGenerator(ServiceDialog):
 
         proc['progress'].update(
             label="finished %d of %d%s\n"
-                  "%d successful, %d failed\n"
+                  "%d successful, %d failed%s\n"
                   "\n"
                   "%s" % (
                       proc['counts']['done'],
@@ -472,6 +613,10 @@ class BrowserGenerator(ServiceDialog):
                       proc['counts']['okay'],
                       proc['counts']['fail'],
 
+                      ", %d already up-to-date" % proc['counts']['current']
+                      if proc['counts']['current']
+                      else "",
+
                       "sleeping for %d second%s" % (
                           proc['throttling']['countdown'],
                           "s"
@@ -560,6 +705,17 @@ class BrowserGenerator(ServiceDialog):
         else:
             messages.append("there were no errors.")
 
+        if proc['counts']['current']:
+            messages.append("\n\n")
+            messages.append(
+                "%d note%s already had up-to-date audio, so %s left alone." % (
+                    proc['counts']['current'],
+                    "s" if proc['counts']['current'] != 1 else "",
+                    "they were" if proc['counts']['current'] != 1
+                    else "it was",
+                )
+            )
+
         if proc['aborted']:
             messages.append("\n\n")
             messages.append(
@@ -587,7 +743,8 @@ class BrowserGenerator(ServiceDialog):
         Adds support for fields and behavior.
         """
 
-        source, dest, append, behavior = self._get_field_values()
+        source, dest, append, behavior, incremental = \
+            self._get_field_values()
 
         return dict(
             super(BrowserGenerator, self)._get_all().items() +
@@ -595,6 +752,7 @@ class BrowserGenerator(ServiceDialog):
                 ('last_mass_append', append),
                 ('last_mass_behavior', behavior),
                 ('last_mass_dest', dest),
+                ('last_mass_incremental', incremental),
                 ('last_mass_source', source),
             ]
         )
@@ -602,7 +760,7 @@ class BrowserGenerator(ServiceDialog):
     def _get_field_values(self):
         """
         Returns the user's source and destination fields, append state,
-        and handling mode.
+        handling mode, and incremental mode.
         """
 
         return (
@@ -610,8 +768,74 @@ class BrowserGenerator(ServiceDialog):
             self.findChild(QtGui.QComboBox, 'dest').currentText(),
             self.findChild(QtGui.QRadioButton, 'append').isChecked(),
             self.findChild(Checkbox, 'behavior').isChecked(),
+            self.findChild(Checkbox, 'incremental').isChecked(),
         )
 
+    def _get_eligible(self, source, dest):
+        """
+        Returns the IDs of the selected notes whose note types have both
+        the source and the destination fields.
+        """
+
+        models = self._browser.mw.col.models
+        eligible_mids = set()
+
+        for mid in {mid for _, mid in self._notes}:
+            names = [field['name'] for field in models.get(mid)['flds']]
+            if source in names and dest in names:
+                eligible_mids.add(mid)
+
+        return [
+            note_id
+            for note_id, mid in self._notes
+            if mid in eligible_mids
+        ]
+
+    def _get_notes(self, note_ids):
+        """
+        Yields the notes for the given IDs, loading them from the
+        collection in chunks rather than all at once.
+        """
+
+        get_note = self._browser.mw.col.getNote
+
+        for offset in range(0, len(note_ids), self.LOAD_CHUNK):
+            for note in [get_note(note_id) for note_id
+                         in note_ids[offset:offset + self.LOAD_CHUNK]]:
+                yield note
+
+    def _get_handling(self, now):
+        """
+        Returns the handling options for processing given the values
+        from _get_all().
+        """
+
+        return {
+            'append': now['last_mass_append'],
+            'behavior': now['last_mass_behavior'],
+
+            # incremental mode relies on the hashed cache filenames
+            'incremental': (now['last_mass_incremental'] and
+                            self._addon.config['filenames'] != 'human'),
+        }
+
+    def _get_estimate(self, service, phrase):
+        """
+        Returns the router's estimate for processing the phrase with the
+        given service settings. For groups, the preset that the router
+        would try first is estimated.
+        """
+
+        router = self._addon.router
+        svc_id = service['id']
+
+        if not svc_id.startswith('group:'):
+            return router.get_estimate(svc_id, phrase, service['options'])
+
+        config = self._addon.config
+        return router.get_group_estimate(phrase, config['groups'][svc_id[6:]],
+                                         config['presets'])
+
     def _on_handling_toggled(self):
         """
         Change the text on the behavior checkbox based on the append
@@ -646,6 +870,136 @@ class BrowserGenerator(ServiceDialog):
                     self,
                 )
 
+    def _on_estimate(self):
+        """
+        Runs through the selected notes as a dry run with the current
+        settings, without calling any services, and reports how many are
+        already cached or up-to-date and roughly what the rest will cost
+        in network requests, LAME runs, and time (including throttling).
+        """
+
+        now = self._get_all()
+        source = now['last_mass_source']
+        dest = now['last_mass_dest']
+        svc_id = now['last_service']
+        service = {
+            'id': svc_id,
+            'options': (None if svc_id.startswith('group:') else
+                        now['last_options'][svc_id]),
+        }
+        handling = self._get_handling(now)
+        notes = deque()  # notes whose phrases are being sanitized below
+
+        def sources():
+            """Yields each eligible note's source, remembering the note."""
+
+            for note in self._get_notes(self._get_eligible(source, dest)):
+                notes.append(note)
+                yield note[source]
+
+        totals = dict(notes=0, hits=0, current=0, unusable=0, misses=0,
+                      segments=0, requests=0, transcodes=0, seconds=0.0)
+        calls = {}  # estimated network requests per service
+        measured = True
+
+        QtGui.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        try:
+            for phrase in self._addon.strip.from_note.batch(sources()):
+                note = notes.popleft()
+                totals['notes'] += 1
+
+                if handling['incremental'] and \
+                        self._is_current(note, phrase, service, dest,
+                                         handling):
+                    totals['current'] += 1
+                    continue
+
+                try:
+                    estimate = self._get_estimate(service, phrase)
+                except Exception:  # catch all, pylint:disable=broad-except
+                    totals['unusable'] += 1
+                    continue
+
+                if estimate['hit']:
+                    totals['hits'] += 1
+                    continue
+
+                totals['misses'] += 1
+                for key in ['segments', 'requests', 'transcodes', 'seconds']:
+                    totals[key] += estimate[key]
+                calls[estimate['svc_id']] = \
+                    calls.get(estimate['svc_id'], 0) + estimate['requests']
+                measured = measured and estimate['measured']
+        finally:
+            QtGui.QApplication.restoreOverrideCursor()
+
+        def number(value):
+            """Formats an integer with grouping."""
+            return locale('%d', value, grouping=True)
+
+        if not totals['notes']:
+            self.findChild(Note, 'estimate').setText(
+                "None of the selected notes have both '%s' and '%s' fields." %
+                (source, dest)
+            )
+            return
+
+        # _accept_next() sleeps each time a service reaches the threshold
+        threshold = max(self._addon.config['throttle_threshold'], 1)
+        throttled = max([(count - 1) // threshold
+                         for count in calls.values()
+                         if count] or [0]) * \
+            self._addon.config['throttle_sleep']
+
+        messages = [
+            "Of %s eligible note%s, %s already cached" % (
+                number(totals['notes']),
+                "s" if totals['notes'] != 1 else "",
+                number(totals['hits']),
+            ),
+        ]
+        if totals['current']:
+            messages.append(", %s up-to-date" % number(totals['current']))
+        if totals['unusable']:
+            messages.append(", %s not usable w/ these settings" %
+                            number(totals['unusable']))
+        messages.append(", and %s to synthesize" % number(totals['misses']))
+
+        if totals['misses']:
+            messages.append(
+                " in %s segment%s. Expect about %s network request%s and "
+                "%s LAME run%s, taking roughly %s%s.%s" % (
+                    number(totals['segments']),
+                    "s" if totals['segments'] != 1 else "",
+                    number(totals['requests']),
+                    "s" if totals['requests'] != 1 else "",
+                    number(totals['transcodes']),
+                    "s" if totals['transcodes'] != 1 else "",
+                    _duration(totals['seconds'] + throttled),
+                    " (%s of which is throttling)" % _duration(throttled)
+                    if throttled else "",
+                    "" if measured else " Timings are rough guesses until "
+                    "the service has been used in this session.",
+                )
+            )
+        else:
+            messages.append(".")
+
+        self.findChild(Note, 'estimate').setText("".join(messages))
+
+
+def _duration(seconds):
+    """
+    Returns a rough human-readable description of a number of seconds.
+    """
+
+    if seconds < 90:
+        return "%d second%s" % (seconds, "s" if int(seconds) != 1 else "")
+    elif seconds < 5400:
+        return "%d minutes" % round(seconds / 60.0)
+    else:
+        return "%.1f hours" % (seconds / 3600.0)
+
 
 class EditorGenerator(ServiceDialog):
     """
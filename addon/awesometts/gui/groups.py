@@ -23,7 +23,7 @@
 from PyQt4 import QtCore, QtGui
 
 from .base import Dialog
-from .common import Label, Note, Slate
+from .common import Checkbox, Label, Note, Slate
 from .listviews import GroupListView
 
 __all__ = ['Groups']
@@ -96,7 +96,7 @@ class Groups(Dialog):
         """Restores state on opening the dialog."""
 
         self._groups = {
-            name: {'mode': group['mode'], 'presets': group['presets'][:]}
+            name: dict(group, presets=group['presets'][:])
             for name, group in self._addon.config['groups'].items()
         }
         self._on_refresh()
@@ -125,13 +125,69 @@ class Groups(Dialog):
             self._current_group = name
             group = self._groups[name]
 
+            prefer_cached = Checkbox("Play a preset that already has the "
+                                     "audio cached before trying the others")
+            prefer_cached.setChecked(group['mode'] == 'random' or
+                                     group.get('prefer_cached', False))
+            prefer_cached.setEnabled(group['mode'] == 'ordered')
+            prefer_cached.stateChanged.connect(
+                lambda state: group['mode'] == 'ordered' and
+                group.update({'prefer_cached': bool(state)})
+            )
+
+            hedge = Checkbox("If a preset is slow, also start the next one "
+                             "after")
+            hedge.setChecked(group.get('hedge') is not None)
+
+            hedge_secs = QtGui.QDoubleSpinBox()
+            hedge_secs.setRange(0, 30)
+            hedge_secs.setDecimals(1)
+            hedge_secs.setSingleStep(0.5)
+            hedge_secs.setSuffix(" seconds")
+            hedge_secs.setValue(2 if group.get('hedge') is None
+                                else group['hedge'])
+
+            grace_secs = QtGui.QDoubleSpinBox()
+            grace_secs.setRange(0, 30)
+            grace_secs.setDecimals(1)
+            grace_secs.setSingleStep(0.5)
+            grace_secs.setSuffix(" seconds")
+            grace_secs.setValue(group.get('hedge_grace', 1))
+
+            def on_hedge(*args):  # pylint:disable=unused-argument
+                """Updates the hedging options from the inputs."""
+
+                enabled = group['mode'] == 'ordered'
+                hedge.setEnabled(enabled)
+                hedge_secs.setEnabled(enabled and hedge.isChecked())
+                grace_secs.setEnabled(enabled and hedge.isChecked())
+
+                if enabled:
+                    group['hedge'] = (hedge_secs.value() if hedge.isChecked()
+                                      else None)
+                    group['hedge_grace'] = grace_secs.value()
+
+            on_hedge()
+            hedge.stateChanged.connect(on_hedge)
+            hedge_secs.valueChanged.connect(on_hedge)
+            grace_secs.valueChanged.connect(on_hedge)
+
+            def on_mode(mode):
+                """Updates mode; randomized always plays cached first."""
+
+                group['mode'] = mode
+                prefer_cached.setEnabled(mode == 'ordered')
+                prefer_cached.setChecked(mode == 'random' or
+                                         group.get('prefer_cached', False))
+                on_hedge()
+
             randomize = QtGui.QRadioButton("randomized")
             randomize.setChecked(group['mode'] == 'random')
-            randomize.clicked.connect(lambda: group.update({'mode': 'random'}))
+            randomize.clicked.connect(lambda: on_mode('random'))
 
             in_order = QtGui.QRadioButton("in-order")
             in_order.setChecked(group['mode'] == 'ordered')
-            in_order.clicked.connect(lambda: group.update({'mode': 'ordered'}))
+            in_order.clicked.connect(lambda: on_mode('ordered'))
 
             hor = QtGui.QHBoxLayout()
             hor.addWidget(Label("Mode:"))
@@ -141,6 +197,16 @@ class Groups(Dialog):
 
             inner = QtGui.QVBoxLayout()
             inner.addLayout(hor)
+            inner.addWidget(prefer_cached)
+
+            hor = QtGui.QHBoxLayout()
+            hor.addWidget(hedge)
+            hor.addWidget(hedge_secs)
+            hor.addWidget(Label("and wait up to"))
+            hor.addWidget(grace_secs)
+            hor.addWidget(Label("for the preferred one"))
+            hor.addStretch()
+            inner.addLayout(hor)
             inner.addLayout(Slate(
                 "Preset",
                 GroupListView,
@@ -178,6 +244,15 @@ class Groups(Dialog):
                                 "to fallback to another preset if your first "
                                 "choice does not have audio for your input "
                                 "phrase."))
+            vert.addWidget(Note("In either mode, presets that already have "
+                                "audio for the phrase in the cache can be "
+                                "played first, without waiting on the "
+                                "others (always the case in randomized "
+                                "mode)."))
+            vert.addWidget(Note("In-order groups can also start the next "
+                                "preset early if one is slow to respond, "
+                                "playing whichever preferred preset finishes "
+                                "first."))
             vert.addWidget(Label(""), 1)
 
     def _on_group_delete(self):
@@ -237,7 +312,7 @@ class Groups(Dialog):
 
         self._pull_presets()
         self._addon.config['groups'] = {
-            name: {'mode': group['mode'], 'presets': group['presets'][:]}
+            name: dict(group, presets=group['presets'][:])
             for name, group in self._groups.items()
         }
         self._current_group = None
@@ -27,10 +27,12 @@ because interacts with the GUI components of Anki and it also spawns
 alert windows. It also may have more visual components in the future.
 """
 
+from collections import OrderedDict
+from hashlib import sha1
+from itertools import izip_longest
 import re
 
-from BeautifulSoup import BeautifulSoup
-from PyQt4.QtCore import Qt
+from PyQt4.QtCore import Qt, QTimer
 
 from .common import key_event_combo
 
@@ -90,17 +92,28 @@ class Reviewer(object):
         re.IGNORECASE,
     )
 
+    CACHE_SIZE = 250  # extractions and answer sides kept in the cache
+
     __slots__ = [
         '_addon',
         '_alerts',
+        '_cache',  # LRU of recent _extract() and _get_answer() results
         '_mw',
     ]
 
     def __init__(self, addon, alerts, mw):
         self._addon = addon
         self._alerts = alerts
+        self._cache = OrderedDict()
         self._mw = mw
 
+        # sanitized text in the cache goes stale if the template rules change
+        addon.config.bind(
+            list(addon.strip.from_template_front.get_keys() |
+                 addon.strip.from_template_back.get_keys()),
+            lambda config: self._cache.clear(),
+        )
+
     def card_handler(self, state, card):
         """
         Examines the state the of the reviewer and whether automatic
@@ -120,6 +133,10 @@ class Reviewer(object):
                             self._addon.player.otf_answer, self._mw,
                             show_errors=config['automatic_answers_errors'])
 
+        if state == 'question' and config['otf_prefetch_cards']:
+            # deferred so that this card's own audio gets dispatched first
+            QTimer.singleShot(0, lambda: self.prefetch(card))
+
     def key_handler(self, key_event, state, card, replay_audio):
         """
         Examines the key event to see if the user has triggered one of
@@ -174,39 +191,225 @@ class Reviewer(object):
         """
 
         question_html = card.q()
+        full_html = card.a()
 
-        answer_html = self.RE_ANSWER_DIVIDER.split(
-            card.a().
-            replace(question_html, '').
-            replace(self._addon.strip.sounds.anki(question_html), ''),
+        def derive():
+            """Strips the question side out of the full answer HTML."""
 
-            1,  # remove at most one segment in the event of multiple dividers
-        ).pop().strip()
+            answer_html = self.RE_ANSWER_DIVIDER.split(
+                full_html.
+                replace(question_html, '').
+                replace(self._addon.strip.sounds.anki(question_html), ''),
 
-        self._addon.logger.debug("Reinterpreted answer HTML as:\n%s" % (
-            "\n".join("<<< " + line for line in answer_html.split("\n"))
-        ))
+                1,  # remove at most one segment in the event of many dividers
+            ).pop().strip()
 
-        return answer_html
+            self._addon.logger.debug("Reinterpreted answer HTML as:\n%s" % (
+                "\n".join("<<< " + line for line in answer_html.split("\n"))
+            ))
 
-    def _play_html(self, side, html, playback, parent, show_errors=True):
+            return answer_html
+
+        return self._cached(('answer', _digest(question_html),
+                             _digest(full_html)), derive)
+
+    def prefetch(self, card):
+        """
+        Looks ahead at the next few cards in the scheduler's queues and
+        has the router warm its cache for the on-the-fly requests on
+        them, at low priority and without any playback or alerts, so
+        that their audio is ready by the time they are shown.
+
+        Which cards come next is an educated guess based on Anki's
+        learning, review, and new card queues.
+        """
+
+        config = self._addon.config
+        count = config['otf_prefetch_cards']
+        if not count:
+            return
+
+        sides = [side
+                 for side, automatic, shortcut in [
+                     ('front', 'automatic_questions', 'tts_key_q'),
+                     ('back', 'automatic_answers', 'tts_key_a'),
+                 ]
+                 if config[automatic] or config[shortcut]]
+        if not sides:
+            return
+
+        try:
+            col = self._mw.col
+            card_ids = self._get_upcoming(col.sched, count,
+                                          exclude=card.id if card else None)
+        except Exception:  # catch all, pylint:disable=broad-except
+            self._addon.logger.warn("Unable to look ahead in the queues")
+            return
+
+        for card_id in card_ids:
+            try:
+                for request in self.get_requests(col.getCard(card_id), sides):
+                    self.warm(request)
+            except Exception:  # catch all, pylint:disable=broad-except
+                self._addon.logger.warn("Unable to prefetch card %s", card_id)
+
+    def get_requests(self, card, sides=('front', 'back')):
+        """
+        Returns the on-the-fly requests found on the given sides of the
+        card, in the same format as _extract(), front side first.
+        """
+
+        return [request
+                for side in sides
+                for request in self._extract(side,
+                                             card.q() if side == 'front'
+                                             else self._get_answer(card))]
+
+    def _get_upcoming(self, sched, count, exclude=None):
+        """
+        Returns up to count IDs of the cards that the scheduler will
+        most likely show next, skipping over the excluded card ID.
+
+        Learning cards come first, by when they are due, followed by
+        review and new cards taken alternately from the ends of their
+        queues (which is where the scheduler pops them from).
         """
-        Read in the passed HTML, attempt to discover <tts> tags in it,
-        and pass them to the router for processing.
 
-        Additionally, old-style [GTTS], [TTS], and [ATTS] tags are
-        detected and played back, e.g.
+        learning = [card_id
+                    for _, card_id in sorted(getattr(sched, '_lrnQueue',
+                                                     None) or [])]
+        reviews = list(reversed(getattr(sched, '_revQueue', None) or []))
+        news = list(reversed(getattr(sched, '_newQueue', None) or []))
+
+        upcoming = []
+        for card_id in learning + [
+                card_id
+                for pair in izip_longest(reviews[:count], news[:count])
+                for card_id in pair
+        ]:
+            if card_id and card_id != exclude and card_id not in upcoming:
+                upcoming.append(card_id)
+                if len(upcoming) >= count:
+                    break
+
+        return upcoming
+
+    def _extract(self, side, html):
+        """
+        Discovers the on-the-fly TTS requests in the passed HTML and
+        returns them as a list of dicts, each with the following:
+
+            - 'attrs': dict of the tag's attributes (for old-style tags,
+              the service and voice that it specifies)
+            - 'text': sanitized text to be spoken
+            - 'markup': the tag as written, for use in error messages
+            - 'legacy': True for old-style bracket tags
+            - 'problem': for malformed old-style tags, an error message
+
+        Besides <tts> tags, old-style [GTTS], [TTS], and [ATTS] tags are
+        detected, e.g.
 
             - [GTTS:voice:text] or [TTS:g:voice:text] for Yandex (the
               "G" here is for Google TTS, but that service is no longer
               functional as of December 2015)
             - [TTS:espeak:voice:text] for eSpeak
+
+        Tags without any speakable text are left out.
+
+        Results are cached by the side and a digest of its HTML, so the
+        returned list and its dicts must not be modified by callers.
         """
 
         assert side in ['front', 'back'], "invalid 'side' passed"
+        return self._cached((side, _digest(html)),
+                            lambda: self._extract_uncached(side, html))
+
+    def _extract_uncached(self, side, html):
+        """Helper method for _extract() that does the actual parsing."""
+
         from_template = (self._addon.strip.from_template_back if side == 'back'
                          else self._addon.strip.from_template_front)
 
+        requests = []
+
+        for attrs, markup in self._addon.tags.tts(html):
+            text = from_template(markup)
+            if text:
+                requests.append(dict(
+                    attrs=attrs,
+                    text=text,
+                    markup=markup,
+                    legacy=False,
+                    problem=None,
+                ))
+
+        for legacy in self.RE_LEGACY_TAGS.findall(html):
+            markup = '[%sTTS:%s]' % legacy
+            components = legacy[1].split(':')
+
+            if legacy[0] and legacy[0].strip().lower() == 'g':
+                if len(components) < 2:
+                    requests.append(dict(
+                        attrs={}, text=None, markup=markup, legacy=True,
+                        problem="Old-style GTTS bracket tags must specify "
+                                "the voice, e.g. [GTTS:es:hola], "
+                                "[GTTS:es:{{Front}}], [GTTS:en:{{text:Back}}]",
+                    ))
+                    continue
+
+                svc_id = 'yandex'
+
+            else:
+                if len(components) < 3:
+                    requests.append(dict(
+                        attrs={}, text=None, markup=markup, legacy=True,
+                        problem="Old-style TTS bracket tags must specify "
+                                "service and voice, e.g. [TTS:g:es:mundo], "
+                                "[TTS:g:es:{{Front}}], "
+                                "[TTS:g:en:{{text:Back}}]",
+                    ))
+                    continue
+
+                svc_id = components.pop(0)
+
+            voice = components.pop(0)
+            text = from_template(':'.join(components))
+            if text:
+                requests.append(dict(
+                    attrs={'service': svc_id, 'voice': voice},
+                    text=text,
+                    markup=markup,
+                    legacy=True,
+                    problem=None,
+                ))
+
+        return requests
+
+    def _cached(self, key, compute):
+        """
+        Returns the value for the key from the LRU cache, calling the
+        compute function and storing its result on a miss.
+        """
+
+        cache = self._cache
+
+        try:
+            value = cache.pop(key)
+        except KeyError:
+            value = compute()
+            if len(cache) >= self.CACHE_SIZE:
+                cache.popitem(last=False)
+
+        cache[key] = value  # (re)inserted as the most recently used
+        return value
+
+    def _play_html(self, side, html, playback, parent, show_errors=True):
+        """
+        Read in the passed HTML, attempt to discover <tts> tags and
+        old-style bracket tags in it, and pass them to the router for
+        processing.
+        """
+
         # when running in review mode, avoid doing playback of a card that is
         # no longer on-screen
 
@@ -220,39 +423,50 @@ class Reviewer(object):
         else:
             skip_check = False
 
-        def playback_wrapper(*args, **kwargs):
-            """Play audio contingent on matching state."""
+        def checked(play):
+            """Returns a wrapper for play that checks the state first."""
 
-            if skip_check:
-                self._addon.logger.info("No previous state; playing audio")
-                playback(*args, **kwargs)
+            def playback_wrapper(*args, **kwargs):
+                """Play audio contingent on matching state."""
 
-            elif (parent_state == parent.state and
-                  reviewer_state == parent.reviewer.state and
-                  card_id == parent.reviewer.card.id):
-                self._addon.logger.info("Previous state same; playing audio")
-                playback(*args, **kwargs)
+                if skip_check:
+                    self._addon.logger.info("No previous state; playing audio")
+                    play(*args, **kwargs)
 
-            else:
-                self._addon.logger.warn("State changed; not playing audio")
+                elif (parent_state == parent.state and
+                      reviewer_state == parent.reviewer.state and
+                      card_id == parent.reviewer.card.id):
+                    self._addon.logger.info("Previous state same; "
+                                            "playing audio")
+                    play(*args, **kwargs)
 
-        for tag in BeautifulTTS(html)('tts'):
-            self._play_html_tag(tag, from_template, playback_wrapper,
-                                parent, show_errors)
+                else:
+                    self._addon.logger.warn("State changed; not playing audio")
 
-        for legacy in self.RE_LEGACY_TAGS.findall(html):
-            self._play_html_legacy(legacy, from_template, playback_wrapper,
-                                   parent, show_errors)
+            return playback_wrapper
+
+        for request in self._extract(side, html):
+            self._play_request(request, checked(playback), parent,
+                               show_errors,
+                               checked(self._addon.player.otf_segment))
+
+    def _play_request(self, request, playback, parent, show_errors=True,
+                      segment=None):
+        """
+        Helper method for _play_html(). If segment is given, long phrases
+        are played progressively, with segment playing every segment
+        after the first one.
+        """
 
-    def _play_html_tag(self, tag, from_template, playback, parent,
-                       show_errors=True):
-        """Helper method for _play_html()."""
+        markup = request['markup']
 
-        text = from_template(unicode(tag))
-        if not text:
+        if request['problem']:
+            if show_errors:
+                self._play_html_bad(markup, request['problem'], parent)
             return
 
-        attr = dict(tag.attrs)
+        text = request['text']
+        attr = dict(request['attrs'])
         config = self._addon.config
 
         if 'group' in attr:
@@ -261,8 +475,7 @@ class Reviewer(object):
             except KeyError:
                 if show_errors:
                     self._alerts(
-                        X_FOR_THIS_TAG_MSG % (attr['group'], "group",
-                                              tag.prettify().decode('utf-8')),
+                        X_FOR_THIS_TAG_MSG % (attr['group'], "group", markup),
                         parent,
                     )
             else:
@@ -278,7 +491,7 @@ class Reviewer(object):
                             not show_errors or
                             self._alerts(
                                 "Unable to play this group tag:\n%s\n\n%s" % (
-                                    tag.prettify().decode('utf-8').strip(),
+                                    markup,
                                     exception.message,
                                 ),
                                 parent,
@@ -295,7 +508,7 @@ class Reviewer(object):
                 if show_errors:
                     self._alerts(
                         X_FOR_THIS_TAG_MSG % (attr['preset'], "preset",
-                                              tag.prettify().decode('utf-8')),
+                                              markup),
                         parent,
                     )
                 return
@@ -305,105 +518,105 @@ class Reviewer(object):
         except KeyError:
             if show_errors:
                 self._alerts(
-                    "This tag needs a 'service' attribute:\n%s" %
-                    tag.prettify().decode('utf-8'),
+                    "This tag needs a 'service' attribute:\n%s" % markup,
                     parent,
                 )
             return
 
-        self._addon.router(
-            svc_id=svc_id,
-            text=text,
-            options=attr,
-            callbacks=dict(
-                okay=playback,
-                fail=lambda exception: (
-                    # we can safely ignore "service busy" errors in review
-                    isinstance(exception, self._addon.router.BusyError) or
-                    not show_errors or
-                    self._alerts(
-                        ("Unable to play this tag:\n%s\n\n%s\n\n"
-                         "If you want AwesomeTTS to automatically fallback to "
-                         "a non-dictionary service when audio is not "
-                         "available, you can setup an in-order playback "
-                         "group. Go to Tools > AwesomeTTS > Advanced > "
-                         "Service Presets and Groups for more information."
-                         if self._addon.router.has_trait(svc_id, 'DICTIONARY')
-                         else "Unable to play this tag:\n%s\n\n%s")
-                        % (
-                            tag.prettify().decode('utf-8').strip(),
-                            exception.message,
-                        ),
-                        parent,
-                    )
-                ),
+        parts = []  # paths of the segments played as they became ready
+
+        def on_part(path):
+            """Plays a segment, with any delay only before the first one."""
+
+            (segment if parts else playback)(path)
+            parts.append(path)
+
+        callbacks = dict(
+            okay=lambda path: parts or playback(path),
+            fail=lambda exception: (
+                # we can safely ignore "service busy" errors in review
+                isinstance(exception, self._addon.router.BusyError) or
+                not show_errors or
+                self._play_html_bad(
+                    markup,
+                    exception.message +
+                    (
+                        "\n\n"
+                        "If you want AwesomeTTS to automatically fallback "
+                        "to a non-dictionary service when audio is not "
+                        "available, you can setup an in-order playback "
+                        "group. Go to Tools > AwesomeTTS > Advanced > "
+                        "Service Presets and Groups for more information."
+                        if not request['legacy'] and
+                        self._addon.router.has_trait(svc_id, 'DICTIONARY')
+                        else ""
+                    ),
+                    parent,
+                )
             ),
         )
+        if segment:
+            callbacks['part'] = on_part
 
-    def _play_html_legacy(self, legacy, from_template, playback, parent,
-                          show_errors=True):
-        """Helper method for _play_html()."""
+        self._addon.router(svc_id=svc_id, text=text, options=attr,
+                           callbacks=callbacks)
 
-        components = legacy[1].split(':')
+    def _play_html_bad(self, markup, message, parent):
+        """Displays an alert for the given tag that cannot be played."""
 
-        if legacy[0] and legacy[0].strip().lower() == 'g':
-            if len(components) < 2:
-                if show_errors:
-                    self._play_html_legacy_bad(
-                        legacy,
-                        "Old-style GTTS bracket tags must specify the "
-                        "voice, e.g. [GTTS:es:hola], [GTTS:es:{{Front}}], "
-                        "[GTTS:en:{{text:Back}}]",
-                        parent,
-                    )
-                return
+        self._alerts("Unable to play this tag:\n%s\n\n%s" % (markup, message),
+                     parent)
 
-            svc_id = 'yandex'
+    def warm(self, request, callbacks=None):
+        """
+        Sends a request from get_requests() off to the router in the
+        background, without any playback or alerts, so that its audio
+        is cached ahead of time.
 
-        else:
-            if len(components) < 3:
-                if show_errors:
-                    self._play_html_legacy_bad(
-                        legacy,
-                        "Old-style TTS bracket tags must specify service and "
-                        "voice, e.g. [TTS:g:es:mundo], [TTS:g:es:{{Front}}], "
-                        "[TTS:g:en:{{text:Back}}]",
-                        parent,
-                    )
-                return
+        Returns False without calling any of the callbacks if the
+        request could not be dispatched at all (e.g. a malformed tag or
+        an unknown preset or group).
+        """
 
-            svc_id = components.pop(0)
+        if request['problem']:
+            return False
 
-        voice = components.pop(0)
+        if not callbacks:
+            ignore = lambda *args: None
+            callbacks = dict(okay=ignore, fail=ignore)
 
-        text = ':'.join(components)
-        text = from_template(text)
-        if not text:
-            return
+        config = self._addon.config
+        attr = dict(request['attrs'])
 
-        self._addon.router(
-            svc_id=svc_id,
-            text=text,
-            options={'voice': voice},
-            callbacks=dict(
-                okay=playback,
-                fail=lambda exception: (
-                    isinstance(exception, self._addon.router.BusyError) or
-                    not show_errors or
-                    self._play_html_legacy_bad(legacy, exception.message,
-                                               parent)
-                ),
-            ),
-        )
+        if 'group' in attr:
+            group = lax_dict_lookup(config['groups'], attr['group'],
+                                    return_none=True)
+            if not group:
+                return False
+
+            self._addon.router.group(text=request['text'],
+                                     group=group,
+                                     presets=config['presets'],
+                                     callbacks=callbacks,
+                                     background=True)
+            return True
 
-    def _play_html_legacy_bad(self, legacy, message, parent):
-        """Reassembles the legacy given tag and displays an alert."""
+        if 'preset' in attr:
+            attr = lax_dict_lookup(config['presets'], attr['preset'],
+                                   return_none=True)
+            if not attr:
+                return False
+            attr = dict(attr)
 
-        self._alerts(
-            "Unable to play this tag:\n[%sTTS:%s]\n\n%s" %
-            (legacy[0], legacy[1], message),
-            parent,
-        )
+        if 'service' not in attr:
+            return False
+
+        self._addon.router(svc_id=attr.pop('service'),
+                           text=request['text'],
+                           options=attr,
+                           callbacks=callbacks,
+                           background=True)
+        return True
 
     def selection_handler(self, text, preset, parent):
         """Play the selected text using the preset."""
@@ -450,26 +663,20 @@ class Reviewer(object):
 
     def has_tts(self, state, card):
         """
-        Does a relatively fast, but inaccurate, check to see if the
-        specified card side might have playable TTS on it.
+        Does a relatively fast check, using the extraction cache, to see
+        if the specified card side has on-the-fly TTS requests on it.
         """
 
-        html = (card.q() if state == 'question'
-                else self._get_answer(card) if state == 'answer'
-                else None)
+        return (state == 'question' and self._extract('front', card.q()) or
+                state == 'answer' and self._extract('back',
+                                                    self._get_answer(card)))
 
-        return html and (BeautifulTTS(html)('tts') or
-                         self.RE_LEGACY_TAGS.search(html))
 
+def _digest(html):
+    """Returns a compact cache key for the passed blob of HTML."""
 
-class BeautifulTTS(BeautifulSoup):  # pylint:disable=abstract-method
-    """
-    Provides a customized version of the BeautifulSoup parser that
-    treats TTS tags as nestable.
-    """
-
-    NESTABLE_TAGS = dict(BeautifulSoup.NESTABLE_TAGS.items() +
-                         [('tts', [])])
+    return sha1(html.encode('utf-8') if isinstance(html, unicode)
+                else html).digest()
 
 
 def lax_dict_lookup(src, key, return_none=False):
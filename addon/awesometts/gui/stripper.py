@@ -22,6 +22,8 @@
 Sound tag-stripper dialog
 """
 
+from itertools import izip
+
 from PyQt4 import QtCore, QtGui
 
 from .base import Dialog
@@ -200,37 +202,44 @@ class BrowserStripper(Dialog):
             fields=dict(proc=0, upd=0, skip=0),
         )
 
+        strips = self._addon.strip.sounds
+        strip = (strips.ours if mode == 'ours'
+                 else strips.theirs if mode == 'theirs'
+                 else strips.univ)
+
+        items = []  # (note, field, old value) for each field to be stripped
+
         for note in self._notes:
-            note_updated = False
             stat['notes']['proc'] += 1
 
             for field in fields:
                 try:
-                    old_value = note[field]
+                    items.append((note, field, note[field]))
                     stat['fields']['proc'] += 1
                 except KeyError:
                     stat['fields']['skip'] += 1
-                    continue
-
-                strips = self._addon.strip.sounds
-                new_value = (strips.ours(old_value) if mode == 'ours'
-                             else strips.theirs(old_value) if mode == 'theirs'
-                             else strips.univ(old_value))
-
-                if old_value == new_value:
-                    self._addon.logger.debug("Note %d unchanged for %s\n%s",
-                                             note.id, field, old_value)
-                else:
-                    self._addon.logger.info("Note %d upd for %s\n%s\n%s",
-                                            note.id, field, old_value,
-                                            new_value)
-                    note[field] = new_value.strip()
-                    note_updated = True
-                    stat['fields']['upd'] += 1
-
-            if note_updated:
-                note.flush()
-                stat['notes']['upd'] += 1
+
+        updated = []  # notes with at least one updated field, in order
+
+        for (note, field, old_value), new_value in izip(
+                items,
+                strip.batch(old_value for _, _, old_value in items),
+        ):
+            if old_value == new_value:
+                self._addon.logger.debug("Note %d unchanged for %s\n%s",
+                                         note.id, field, old_value)
+            else:
+                self._addon.logger.info("Note %d upd for %s\n%s\n%s",
+                                        note.id, field, old_value,
+                                        new_value)
+                note[field] = new_value.strip()
+                stat['fields']['upd'] += 1
+                if not updated or updated[-1] is not note:
+                    updated.append(note)
+
+        for note in updated:
+            note.flush()
+        stat['notes']['upd'] = len(updated)
 
         messages = [
             "%d %s processed and %d %s updated." % (
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+# AwesomeTTS text-to-speech add-on for Anki
+#
+# Copyright (C) 2016       Anki AwesomeTTS Development Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Idle-time cache warming for the on-the-fly audio of today's cards
+
+This module is headless. It lives in the "gui" package because it is
+driven by Qt timers and by the state of Anki's main window.
+"""
+
+from collections import deque
+from datetime import datetime
+from glob import glob
+import os.path
+import subprocess
+import sys
+from time import time
+
+from PyQt4.QtCore import QTimer
+
+__all__ = ['Warmer']
+
+
+class Warmer(object):
+    """
+    Walks the cards that are due today (reviews and learning cards
+    across all decks) while Anki sits idle, sending the on-the-fly
+    requests on them through the reviewer's background warming so that
+    a later review session, even an offline one, plays from the cache.
+
+    Progress is stored in the configuration after every few cards, so
+    an interrupted warm-up picks up where it left off on the same day.
+    """
+
+    CHECK_INTERVAL = 60  # seconds between checks for whether we are idle
+
+    SAVE_EVERY = 10  # cards between saves of progress to the configuration
+
+    SQL_DUE = ('select id from cards '
+               'where id > ? and ((queue in (2, 3) and due <= ?) or '
+               '(queue = 1 and due <= ?)) '
+               'order by id')
+
+    __slots__ = [
+        '_activity',  # timestamp of the last known reviewer activity
+        '_addon',     # bundle with config, logger, router
+        '_mw',        # Anki's main window, for getting to the collection
+        '_reviewer',  # Reviewer instance, for its tag extraction and warming
+        '_run',       # dict with the state of a warm-up in progress, if any
+        '_timer',     # QTimer that periodically checks for idleness
+    ]
+
+    def __init__(self, addon, reviewer, mw):
+        self._activity = time()
+        self._addon = addon
+        self._mw = mw
+        self._reviewer = reviewer
+        self._run = None
+
+        self._timer = QTimer()
+        self._timer.timeout.connect(self._on_check)
+        self._timer.start(self.CHECK_INTERVAL * 1000)
+
+    def poke(self):
+        """
+        Records reviewer activity, which pauses any warm-up in progress
+        until the next idle period.
+        """
+
+        self._activity = time()
+
+    def is_idle(self, check_power=True):
+        """
+        Returns True if warming is enabled and all of its conditions
+        are currently met (i.e. no recent reviewer activity, within the
+        configured hours, and, if requested, running on AC power).
+
+        The power source can be slow to look up (e.g. running pmset on
+        Mac OS X), so it may be skipped with check_power=False.
+        """
+
+        config = self._addon.config
+
+        if not config['warm_enabled'] or not self._mw.col:
+            return False
+
+        if time() - self._activity < config['warm_idle_minutes'] * 60:
+            return False
+
+        start, end = config['warm_hour_start'], config['warm_hour_end']
+        if start != end:
+            hour = datetime.now().hour
+            if not (start <= hour < end if start < end
+                    else hour >= start or hour < end):
+                return False
+
+        if check_power and config['warm_ac_only'] and not _on_ac_power():
+            return False
+
+        return True
+
+    def _on_check(self):
+        """
+        Starts a warm-up if none is running and we are idle, or stops
+        the one running if we no longer are (e.g. now on battery).
+        """
+
+        if not self.is_idle():
+            if self._run:
+                self._stop("Anki is no longer idle")
+            return
+
+        if self._run:
+            return
+
+        config = self._addon.config
+        sched = self._mw.col.sched
+
+        if config['warm_day'] != sched.today:
+            config.update(dict(warm_day=sched.today, warm_last_id=0,
+                               warm_done=0, warm_total=0))
+
+        try:
+            card_ids = self._mw.col.db.list(self.SQL_DUE,
+                                            config['warm_last_id'],
+                                            sched.today, sched.dayCutoff)
+        except Exception:  # catch all, pylint:disable=broad-except
+            self._addon.logger.warn("Unable to look up today's due cards")
+            return
+
+        config['warm_total'] = config['warm_done'] + len(card_ids)
+        if not card_ids:
+            return
+
+        self._addon.logger.info("Warming cache for %d card(s) due today",
+                                len(card_ids))
+
+        self._run = {
+            'card_id': None,  # card whose requests are being dispatched
+            'card_ids': deque(card_ids),
+            'last_id': None,  # most recently completed card
+            'requests': deque(),
+            'saved': 0,  # cards completed since the last save of progress
+            'throttling': {
+                'calls': {},  # unthrottled download calls made per service
+                'sleep': config['throttle_sleep'],
+                'threshold': config['throttle_threshold'],
+            },
+        }
+        self._next()
+
+    def _next(self):
+        """
+        Dispatches the next request of the current card, moving onto
+        the next card once all of the current card's requests are done.
+        """
+
+        run = self._run
+        if not run:
+            return
+
+        if not self.is_idle(check_power=False):  # checked by _on_check()
+            self._stop("Anki is no longer idle")
+            return
+
+        throttling = run['throttling']
+        if throttling['calls'] and \
+           max(throttling['calls'].values()) >= throttling['threshold']:
+            throttling['calls'] = {}
+            QTimer.singleShot(throttling['sleep'] * 1000, self._next)
+            return
+
+        if not run['requests']:
+            if run['card_id']:
+                self._completed(run['card_id'])
+                run['card_id'] = None
+
+            if not run['card_ids']:
+                self._stop("Finished warming cache for today's cards")
+                return
+
+            card_id = run['card_ids'].popleft()
+            try:
+                run['requests'].extend(self._reviewer.get_requests(
+                    self._mw.col.getCard(card_id)
+                ))
+            except Exception:  # catch all, pylint:disable=broad-except
+                self._addon.logger.warn("Unable to warm card %s", card_id)
+            run['card_id'] = card_id
+
+            if not run['requests']:
+                # one card per pass keeps the main thread responsive
+                QTimer.singleShot(0, self._next)
+                return
+
+        def miss(svc_id, count):
+            """Count the download call(s) against the service."""
+
+            try:
+                throttling['calls'][svc_id] += count
+            except KeyError:
+                throttling['calls'][svc_id] = count
+
+        ignore = lambda *args: None
+
+        if not self._reviewer.warm(
+                run['requests'].popleft(),
+                callbacks=dict(
+                    okay=ignore, fail=ignore, miss=miss,
+                    # deferred so that the router has finished its own work
+                    then=lambda: QTimer.singleShot(0, self._next),
+                ),
+        ):
+            QTimer.singleShot(0, self._next)
+
+    def _completed(self, card_id):
+        """Records that all of the card's requests have been processed."""
+
+        run = self._run
+        run['last_id'] = card_id
+        run['saved'] += 1
+
+        if run['saved'] >= self.SAVE_EVERY:
+            self._save()
+
+    def _save(self):
+        """Stores the progress made since the last save."""
+
+        run = self._run
+        if run['saved']:
+            config = self._addon.config
+            config.update(dict(warm_last_id=run['last_id'],
+                               warm_done=config['warm_done'] + run['saved']))
+            run['saved'] = 0
+
+    def _stop(self, reason):
+        """Saves progress on the cards completed so far and stops."""
+
+        self._save()
+        self._run = None
+        self._addon.logger.info(reason)
+
+
+def _on_ac_power():
+    """
+    Returns False if the computer is known to be running on battery,
+    and True otherwise (including when the power source is unknown).
+    """
+
+    try:
+        if sys.platform.startswith('win'):
+            import ctypes
+
+            class PowerStatus(ctypes.Structure):  # pylint:disable=R0903
+                """Mirrors the SYSTEM_POWER_STATUS structure."""
+
+                _fields_ = [
+                    ('ACLineStatus', ctypes.c_ubyte),
+                    ('BatteryFlag', ctypes.c_ubyte),
+                    ('BatteryLifePercent', ctypes.c_ubyte),
+                    ('SystemStatusFlag', ctypes.c_ubyte),
+                    ('BatteryLifeTime', ctypes.c_ulong),
+                    ('BatteryFullLifeTime', ctypes.c_ulong),
+                ]
+
+            status = PowerStatus()
+            if ctypes.windll.kernel32.GetSystemPowerStatus(
+                    ctypes.byref(status)):
+                return status.ACLineStatus != 0  # 1 is online, 255 unknown
+
+        elif sys.platform == 'darwin':
+            return 'Battery Power' not in subprocess.check_output(
+                ['pmset', '-g', 'batt']
+            )
+
+        else:
+            readings = []
+            for online in glob('/sys/class/power_supply/*/online'):
+                with open(os.path.join(os.path.dirname(online),
+                                       'type')) as type_file:
+                    if type_file.read().strip() != 'Mains':
+                        continue
+                with open(online) as online_file:
+                    readings.append(online_file.read().strip() == '1')
+
+            if readings:
+                return any(readings)
+
+    except Exception:  # catch all, pylint:disable=broad-except
+        pass
+
+    return True
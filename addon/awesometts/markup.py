@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+
+# AwesomeTTS text-to-speech add-on for Anki
+#
+# Copyright (C) 2016       Anki AwesomeTTS Development Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Fast lookups of specific elements in card HTML
+
+The functions here give the same results as building a BeautifulSoup 3
+tree and serializing parts of it, but do so in a single streaming pass
+that only keeps track of the tag stack. This is done by mirroring how
+sgmllib tokenizes the markup and how BeautifulSoup nests, closes, and
+renders the tags. Rarely-seen constructs whose handling is intricate
+(e.g. declarations, processing instructions, <meta> tags) are handed
+off to BeautifulSoup itself.
+"""
+
+import re
+
+from BeautifulSoup import BeautifulSoup
+
+__all__ = ['inner_html', 'outer_html', 'without']
+
+
+# tokenizing, as done by sgmllib and BeautifulSoup's markup massage
+
+_MASSAGE = [(re.compile(r'(<[^<>]*)/>'), r'\1 />'),
+            (re.compile(r'<!\s+([^<>]*)>'), r'<!\1>')]
+
+_INTERESTING = re.compile('[&<]')
+_INCOMPLETE = re.compile('&([a-zA-Z][a-zA-Z0-9]*|#[0-9]*)?|'
+                         '<([a-zA-Z][^<>]*|/([a-zA-Z][^<>]*)?|![^<>]*)?')
+_ENTITYREF = re.compile('&([a-zA-Z][-.a-zA-Z0-9]*)[^a-zA-Z0-9]')
+_CHARREF = re.compile('&#([0-9]+)[^0-9]')
+_STARTTAGOPEN = re.compile('<[>a-zA-Z]')
+_SHORTTAGOPEN = re.compile('<[a-zA-Z][-.a-zA-Z0-9]*/')
+_ENDBRACKET = re.compile('[<>]')
+_TAGFIND = re.compile('[a-zA-Z][-_.:a-zA-Z0-9]*')
+_ATTRFIND = re.compile(r'\s*([a-zA-Z_][-:.a-zA-Z_0-9]*)(\s*=\s*'
+                       r'(\'[^\']*\'|"[^"]*"|'
+                       r'[][\-a-zA-Z0-9./,:;+*%?!&$\(\)_#=~\'"@]*))?')
+_ATTR_REF = re.compile('&(?:([a-zA-Z][-.a-zA-Z0-9]*)|#([0-9]+))(;?)')
+_COMMENT_CLOSE = re.compile(r'--\s*>')
+
+# tree building and rendering, as done by BeautifulSoup
+
+_TAG_REF = re.compile(r'&(#\d+|#x[0-9a-fA-F]+|\w+);')
+_BARE = re.compile(r'([<>]|&(?!#\d+;|#x[0-9a-fA-F]+;|\w+;))')
+_BARE_ENTITIES = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
+_XML_ENTITIES = {'lt': '<', 'gt': '>', 'amp': '&', 'quot': '"', 'apos': "'"}
+_ASCII_SPACES = u'\t\n\x0c\r '
+
+_ROOT = u'[document]'
+_SELF_CLOSING = set(['br', 'hr', 'input', 'img', 'meta', 'spacer', 'link',
+                     'frame', 'base', 'col'])
+_PRESERVE_WHITESPACE = set(['pre', 'textarea'])
+_QUOTE = set(['script', 'textarea'])
+_NESTABLE = dict(
+    [(name, []) for name in ['span', 'font', 'q', 'object', 'bdo', 'sub',
+                             'sup', 'center', 'blockquote', 'div',
+                             'fieldset', 'ins', 'del', 'ol', 'ul', 'dl',
+                             'table']] +
+    [('li', ['ul', 'ol']), ('dd', ['dl']), ('dt', ['dl']),
+     ('tr', ['table', 'tbody', 'tfoot', 'thead']), ('td', ['tr']),
+     ('th', ['tr']), ('thead', ['table']), ('tbody', ['table']),
+     ('tfoot', ['table'])]
+)
+_RESET_NESTING = set(['blockquote', 'div', 'fieldset', 'ins', 'del',
+                      'noscript', 'address', 'form', 'p', 'pre', 'ol', 'ul',
+                      'li', 'dl', 'dd', 'dt', 'table', 'tr', 'td', 'th',
+                      'thead', 'tbody', 'tfoot'])
+
+
+def inner_html(html, name, attrs=None):
+    """
+    Returns a list with the rendered contents of every element with the
+    given name and exactly-matching attributes, in document order.
+    """
+
+    if '<' + name not in html.lower():
+        return []
+
+    try:
+        pieces, elements = _scan(html, name, attrs)
+    except _Unsupported:
+        return [''.join(unicode(content) for content in tag.contents)
+                for tag in BeautifulSoup(html)(name, attrs=attrs or {})]
+
+    return [''.join(pieces[inner:end - 1])
+            for _, inner, end, _ in elements]
+
+
+def outer_html(html, name, nestable=False):
+    """
+    Returns a list of (attributes dict, rendered element) tuples for
+    every element with the given name, in document order. If nestable
+    is set, elements of this name may contain one another.
+    """
+
+    if '<' + name not in html.lower():
+        return []
+
+    try:
+        pieces, elements = _scan(html, name, nestable=nestable)
+    except _Unsupported:
+        return [(dict(tag.attrs), unicode(tag))
+                for tag in _soup_class(name if nestable else None)(html)(name)]
+
+    return [(dict(attrs), ''.join(pieces[start:end]))
+            for start, _, end, attrs in elements]
+
+
+def without(html, name, attrs=None):
+    """
+    Returns the rendered HTML with every element with the given name
+    and exactly-matching attributes removed.
+    """
+
+    try:
+        pieces, elements = _scan(html, name, attrs)
+    except _Unsupported:
+        soup = BeautifulSoup(html)
+        tags = soup.findAll(name, attrs=attrs or {})
+        while tags:
+            tags.pop().extract()
+        return unicode(soup)
+
+    if not elements:
+        return ''.join(pieces)
+
+    result = []
+    position = 0
+    for start, _, end, _ in elements:
+        if start >= position:  # i.e. not nested within a removed element
+            result.extend(pieces[position:start])
+            position = end
+    result.extend(pieces[position:])
+    return ''.join(result)
+
+
+class _Unsupported(Exception):
+    """Raised when the markup needs the full BeautifulSoup treatment."""
+
+
+_SOUP_CLASSES = {None: BeautifulSoup}
+
+
+def _soup_class(nestable):
+    """Returns a BeautifulSoup class treating the given tag as nestable."""
+
+    try:
+        return _SOUP_CLASSES[nestable]
+    except KeyError:
+        _SOUP_CLASSES[nestable] = soup_class = type(
+            'Nestable' + str(nestable).title() + 'Soup',
+            (BeautifulSoup,),
+            dict(NESTABLE_TAGS=dict(BeautifulSoup.NESTABLE_TAGS.items() +
+                                    [(nestable, [])])),
+        )
+        return soup_class
+
+
+def _escape(data):
+    """Escapes bare ampersands and angle brackets like BeautifulSoup."""
+
+    if '<' in data or '>' in data or '&' in data:
+        return _BARE.sub(lambda match: _BARE_ENTITIES[match.group(0)], data)
+    return data
+
+
+def _convert_attr_ref(match):
+    """Converts references in attribute values like sgmllib."""
+
+    entity, number, semicolon = match.groups()
+
+    if number:
+        return (chr(int(number)) if int(number) <= 127
+                else '&#%s%s' % (number, semicolon))
+    elif semicolon:
+        return _XML_ENTITIES.get(entity, '&%s;' % entity)
+    else:
+        return '&' + entity
+
+
+def _convert_tag_ref(match):
+    """Converts references in attribute values like BeautifulSoup."""
+
+    ref = match.group(1)
+    if ref[0] == '#':
+        return unichr(int(ref[2:], 16) if ref[1:2] == 'x' else int(ref[1:]))
+    return u'&%s;' % ref
+
+
+def _render_attrs(attrs):
+    """Renders attributes for a start tag like BeautifulSoup."""
+
+    rendered = []
+
+    for key, value in attrs:
+        template = '%s="%s"'
+        if '"' in value:
+            template = "%s='%s'"
+            if "'" in value:
+                value = value.replace("'", "&squot;")
+        rendered.append(template % (key, _escape(value)))
+
+    return ' ' + ' '.join(rendered) if rendered else ''
+
+
+def _scan(html, name, attrs=None, nestable=False):
+    """
+    Renders the HTML like BeautifulSoup would, returning a list of the
+    rendered pieces and a list of (start, inner, end, attrs) tuples for
+    each element with the given name and matching attributes, where the
+    positions are slice indices into the list of pieces.
+
+    Raises _Unsupported if the markup needs BeautifulSoup's treatment.
+    """
+
+    if not isinstance(html, unicode):
+        raise _Unsupported
+
+    for pattern, replacement in _MASSAGE:
+        html = pattern.sub(replacement, html)
+
+    nesting = dict(_NESTABLE, **{name: []}) if nestable else _NESTABLE
+    pieces = []
+    elements = []
+    stack = [(_ROOT, None, None)]  # (tag name, start index, attributes)
+    quotes = []
+    data = []
+
+    def flush(template=None):
+        """Renders any buffered data, like BeautifulSoup's endData()."""
+
+        if not data:
+            return
+
+        current = u''.join(data)
+        del data[:]
+
+        if not current.strip(_ASCII_SPACES) and \
+                not any(tag in _PRESERVE_WHITESPACE for tag, _, _ in stack):
+            current = '\n' if '\n' in current else ' '
+
+        current = _escape(current)
+        pieces.append(template % current if template else current)
+
+    def close():
+        """Renders the end of the innermost open element."""
+
+        tag, start, tag_attrs = stack.pop()
+        pieces.append('</%s>' % tag)
+
+        if tag == name and (not attrs or _matches(tag_attrs, attrs)):
+            elements.append((start, start + 1, len(pieces), tag_attrs))
+
+    def pop_to(tag, inclusive=True):
+        """Closes open elements up to the given one, like _popToTag()."""
+
+        if tag == _ROOT:
+            return
+
+        count = 0
+        for i in range(len(stack) - 1, 0, -1):
+            if stack[i][0] == tag:
+                count = len(stack) - i
+                break
+        if not inclusive:
+            count -= 1
+
+        for _ in range(count):
+            close()
+
+    def smart_pop(tag):
+        """Closes elements that the given tag implies, like _smartPop()."""
+
+        triggers = nesting.get(tag)
+        is_reset = tag in _RESET_NESTING
+
+        for i in range(len(stack) - 1, 0, -1):
+            other = stack[i][0]
+            if other == tag and triggers is None:
+                pop_to(tag)
+                return
+            if triggers is not None and other in triggers or \
+                    triggers is None and is_reset and other in _RESET_NESTING:
+                pop_to(other, inclusive=False)
+                return
+
+    def start_tag(tag, tag_attrs):
+        """Handles an opening tag, like unknown_starttag()."""
+
+        if quotes:
+            data.append('<%s%s>' % (tag, ''.join(' %s="%s"' % pair
+                                                  for pair in tag_attrs)))
+            return
+
+        flush()
+
+        tag_attrs = [(key, _TAG_REF.sub(_convert_tag_ref, value)
+                      if '&' in value else value)
+                     for key, value in tag_attrs]
+
+        if tag in _SELF_CLOSING:
+            pieces.append('<%s%s />' % (tag, _render_attrs(tag_attrs)))
+            if tag == name and (not attrs or _matches(tag_attrs, attrs)):
+                elements.append((len(pieces) - 1, len(pieces), len(pieces),
+                                 tag_attrs))
+            return
+
+        smart_pop(tag)
+        stack.append((tag, len(pieces), tag_attrs))
+        pieces.append('<%s%s>' % (tag, _render_attrs(tag_attrs)))
+
+        if tag in _QUOTE:
+            quotes.append(tag)
+            return True
+
+    def end_tag(tag):
+        """Handles a closing tag, like unknown_endtag()."""
+
+        if quotes and quotes[-1] != tag:
+            data.append('</%s>' % tag)
+            return
+
+        flush()
+        pop_to(tag)
+        if quotes and quotes[-1] == tag:
+            quotes.pop()
+
+    literal = False
+    i = 0
+    length = len(html)
+
+    while i < length:
+        match = _INTERESTING.search(html, i)
+        j = match.start() if match else length
+        if i < j:
+            data.append(html[i:j])
+        i = j
+        if i == length:
+            break
+
+        if html[i] == '<':
+            if _STARTTAGOPEN.match(html, i):
+                if literal:
+                    data.append('<')
+                    i += 1
+                    continue
+
+                if _SHORTTAGOPEN.match(html, i) or html[i + 1] == '>':
+                    raise _Unsupported
+
+                match = _ENDBRACKET.search(html, i + 1)
+                if not match:
+                    break
+                j = match.start()
+
+                k = _TAGFIND.match(html, i + 1).end()
+                tag = html[i + 1:k].lower()
+                if tag == 'meta':
+                    raise _Unsupported
+
+                tag_attrs = []
+                while k < j:
+                    match = _ATTRFIND.match(html, k)
+                    if not match:
+                        break
+                    key, rest, value = match.group(1, 2, 3)
+                    if not rest:
+                        value = key
+                    else:
+                        if value[:1] == "'" == value[-1:] or \
+                                value[:1] == '"' == value[-1:]:
+                            value = value[1:-1]
+                        if '&' in value:
+                            value = _ATTR_REF.sub(_convert_attr_ref, value)
+                    tag_attrs.append((key.lower(), value))
+                    k = match.end()
+
+                if html[j] == '>':
+                    j += 1
+                if start_tag(tag, tag_attrs):
+                    literal = True
+                i = j
+                continue
+
+            if html.startswith('</', i):
+                match = _ENDBRACKET.search(html, i + 1)
+                if not match:
+                    break
+                j = match.start()
+                end_tag(html[i + 2:j].strip().lower())
+                if html[j] == '>':
+                    j += 1
+                i = j
+                literal = False
+                continue
+
+            if literal:
+                if length > i + 1:
+                    data.append('<')
+                    i += 1
+                    continue
+                break
+
+            if html.startswith('<!--', i):
+                match = _COMMENT_CLOSE.search(html, i + 4)
+                if not match:
+                    break
+                flush()
+                data.append(html[i + 4:match.start()])
+                flush('<!--%s-->')
+                i = match.end()
+                continue
+
+            if html.startswith('<?', i) or html.startswith('<!', i):
+                raise _Unsupported
+
+        else:  # ampersand
+            if literal:
+                data.append('&')
+                i += 1
+                continue
+
+            match = _CHARREF.match(html, i) or _ENTITYREF.match(html, i)
+            if match:
+                data.append(('&#%s;' if match.re is _CHARREF else '&%s;') %
+                            match.group(1))
+                i = match.end()
+                if html[i - 1] != ';':
+                    i -= 1
+                continue
+
+        match = _INCOMPLETE.match(html, i)
+        if not match:
+            data.append(html[i])
+            i += 1
+            continue
+        j = match.end()
+        if j == length:
+            break  # n.b. BeautifulSoup drops a really incomplete remainder
+        data.append(html[i:j])
+        i = j
+
+    flush()
+    while len(stack) > 1:
+        close()
+
+    elements.sort()
+    return pieces, elements
+
+
+def _matches(tag_attrs, attrs):
+    """Returns True if the attributes (last one wins) match exactly."""
+
+    tag_attrs = dict(tag_attrs)
+    return all(tag_attrs.get(key) == value for key, value in attrs.items())
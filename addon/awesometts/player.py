@@ -22,7 +22,9 @@
 Playback interface, providing user-configured delays
 """
 
-import inspect
+import os.path
+import sys
+import wave
 
 from .text import RE_FILENAMES
 
@@ -32,16 +34,20 @@ __all__ = ['Player']
 class Player(object):
     """Once instantiated, provides interfaces for playing audio."""
 
+    SILENCE_RATE = 8000  # samples per second in generated silence clips
+
     __slots__ = [
         '_anki',    # bundle with mw, native (play function), sound (module)
-        '_blank',   # path to a blank 1-second MP3
+        '_blank',   # path to a blank 1-second MP3, if silence cannot be made
+        '_cache',   # directory where generated silence clips are kept
         '_config',  # dict-like interface for looking up user configuration
         '_logger',  # logger-like interface for debugging the Player instance
     ]
 
-    def __init__(self, anki, blank, config, logger=None):
+    def __init__(self, anki, blank, cache, config, logger=None):
         self._anki = anki
         self._blank = blank
+        self._cache = cache
         self._config = config
         self._logger = logger
 
@@ -85,6 +91,15 @@ class Player(object):
         self._insert_blanks(0, "on-the-fly shortcut", path)
         self._anki.native(path)
 
+    def otf_segment(self, path):
+        """
+        Play path with no delay, as a later segment of an on-the-fly
+        phrase whose first segment has already been played.
+        """
+
+        self._insert_blanks(0, "on-the-fly segment", path)
+        self._anki.native(path)
+
     def native_wrapper(self, path):
         """
         Provides a function that can be used as a wrapper around the
@@ -95,10 +110,7 @@ class Player(object):
         if self._anki.mw.state != 'review':
             self._insert_blanks(0, "wrapped, non-review", path)
 
-        elif next((True
-                   for frame in inspect.stack()
-                   if frame[3] in self.native_wrapper.BLACKLISTED_FRAMES),
-                  False):
+        elif _called_from(self.native_wrapper.BLACKLISTED_FRAMES):
             self._insert_blanks(0, "wrapped, blacklisted caller", path)
 
         elif self._anki.mw.reviewer.state == 'question':
@@ -143,18 +155,72 @@ class Player(object):
 
     def _insert_blanks(self, seconds, reason, path):
         """
-        Insert silence of the given seconds, unless Anki's queue has
-        items in it already.
+        Insert silence of the given seconds (which may be fractional),
+        unless Anki's queue has items in it already.
         """
 
         if self._anki.sound.mplayerQueue:
             if self._logger:
-                self._logger.debug("Ignoring %d-second delay (%s) because of "
+                self._logger.debug("Ignoring %g-second delay (%s) because of "
                                    "queue: %s", seconds, reason, path)
             return
 
         if self._logger:
-            self._logger.debug("Need %d-second delay (%s): %s",
+            self._logger.debug("Need %g-second delay (%s): %s",
                                seconds, reason, path)
-        for _ in range(seconds):
-            self._anki.native(self._blank)
+
+        milliseconds = int(round(seconds * 1000))
+        if milliseconds <= 0:
+            return
+
+        try:
+            self._anki.native(self._get_silence(milliseconds))
+
+        except (EnvironmentError, wave.Error) as exception:
+            if self._logger:
+                self._logger.warn("Cannot make %d ms of silence (%s); "
+                                  "using whole seconds of blank audio",
+                                  milliseconds, exception)
+            for _ in range(int(round(seconds))):
+                self._anki.native(self._blank)
+
+    def _get_silence(self, milliseconds):
+        """
+        Returns the path to a WAV file of silence lasting the given
+        milliseconds, writing it into the cache if it is not there yet.
+        """
+
+        path = os.path.join(self._cache, 'silence-%dms.wav' % milliseconds)
+
+        if not os.path.exists(path):
+            clip = wave.open(path, 'wb')
+            try:
+                clip.setnchannels(1)
+                clip.setsampwidth(1)  # 8-bit samples are unsigned, 128 is 0
+                clip.setframerate(self.SILENCE_RATE)
+                clip.writeframes('\x80' *
+                                 (self.SILENCE_RATE * milliseconds // 1000))
+            except Exception:
+                clip.close()
+                os.unlink(path)  # do not leave a truncated clip behind
+                raise
+            clip.close()
+
+        return path
+
+
+def _called_from(names):
+    """
+    Returns True if any function on the current call stack has one of
+    the given names. Only the code objects of the frames are looked at,
+    which is much cheaper than inspect.stack() reading their sources.
+    """
+
+    frame = sys._getframe(1)  # pylint:disable=protected-access
+
+    while frame:
+        if frame.f_code.co_name in names:
+            return True
+        frame = frame.f_back
+
+    return False
@@ -22,26 +22,61 @@
 Dispatch management of available services
 """
 
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from hashlib import sha1
+from heapq import heappop, heappush
+import json
 import os
 import os.path
 from random import shuffle
 import re
 from httplib import IncompleteRead
 from socket import error as SocketError
+from struct import unpack
 from time import time
 from urllib2 import URLError
 
 from PyQt4 import QtCore, QtGui
 
 from .service import Trait as BaseTrait
+from .service import mp3
 
 __all__ = ['Router']
 
 
 _SIGNAL = QtCore.SIGNAL('awesomeTtsThreadDone')
 
+BREAKER_PROBE_SECS = 60  # wait before letting a probe through a tripped svc
+
+BREAKER_THRESHOLD = 3  # consecutive network errors that trip a svc's breaker
+
+DICTIONARY_MISS_BITS = 2 ** 17  # size of each svc's filter of missing words
+
+DICTIONARY_MISS_HASHES = 9  # bits set in a svc's filter for each missing word
+
+DICTIONARY_MISS_LIMIT = 10000  # missing words per filter before starting anew
+
+DICTIONARY_MISS_RECENT = 1000  # most recent missing words remembered exactly
+
+DICTIONARY_MISS_SAVE_SECS = 60  # wait after a new missing word to save filters
+
+DICTIONARY_MISS_SECS = 30 * 86400  # forget missing words after thirty days
+
 FAILURE_CACHE_SECS = 3600  # ignore/dump failures from cache after one hour
 
+FAILURE_CACHE_SIZE = 1000  # most failures remembered, dropping oldest first
+
+FAILURE_MESSAGE_MAX = 500  # longest message remembered for a failure
+
+HEDGE_GRACE_SECS = 1.0  # default wait on higher-priority presets in hedging
+
+# per-segment guesses used for estimates until a service has been measured
+ESTIMATE_DEFAULTS = {
+    'local': dict(requests=0.0, seconds=1.0),
+    'online': dict(requests=1.0, seconds=1.5),
+}
+
 RE_MUSTACHE = re.compile(r'\{?\{\{(.+?)\}\}\}?')
 RE_UNSAFE = re.compile(r'[^\w\s()-]', re.UNICODE)
 RE_WHITESPACE = re.compile(r'[\0\s]+', re.UNICODE)
@@ -75,18 +110,38 @@ class Router(object):
     class BusyError(RuntimeError):
         """Raised for requests for files that are already underway."""
 
+    class MissingError(RuntimeError):
+        """Raised for requests for words a dictionary is known to lack."""
+
+    class RememberedError(RuntimeError):
+        """
+        Raised for requests that failed recently, with the message and
+        the name of the exception class (as `kind`) from that failure.
+        """
+
+    class TrippedError(RuntimeError):
+        """Raised for requests to a service that keeps failing to connect."""
+
     __slots__ = [
-        '_busy',       # list of file paths that are in-progress
+        '_blooms',     # lookup of svc_id to _Bloom of words it is missing
+        '_breakers',   # lookup of svc_id to circuit breaker state, if tripping
+        '_busy',       # in-progress paths to (background?, waiting calls)
         '_cache_dir',  # path for writing cached media files
         '_config',     # user configuration (dict-like)
-        '_failures',   # lookup of file paths that raised exceptions
+        '_expiries',   # heap of (time, file path) for expiring failures
+        '_failures',   # lookup of file paths to (time, kind, message)
         '_logger',     # logger-like interface with debug(), info(), etc.
+        '_missing',    # OrderedDict of recently missing words' keys to time
         '_pool',       # instance of the _Pool class for managing threads
         '_services',   # bundle with dead services, aliases, avail, lookup
+        '_stats',      # measured runs, segments, requests, seconds by svc_id
+        '_store',      # persistent Store for failures and missing words
         '_temp_dir',   # path for writing human-readable filenames
+        '_unsaved',    # set of svc_ids whose _Bloom has changed since saved
     ]
 
-    def __init__(self, services, cache_dir, temp_dir, logger, config):
+    def __init__(self, services, cache_dir, temp_dir, logger, config,
+                 store):
         """
         The services should be a bundle with the following:
 
@@ -104,6 +159,10 @@ class Router(object):
         The logger object should have an interface like the one used by
         the standard library logging module, with debug(), info(), and
         so on, available.
+
+        The store should be a Store instance, which is used to remember
+        failures and the words that dictionary services are missing
+        across sessions.
         """
 
         services.aliases = {
@@ -122,14 +181,54 @@ class Router(object):
             for svc_id, svc_class in services.mappings
         }
 
-        self._busy = []
+        self._blooms = {}
+        self._breakers = {}
+        self._busy = {}
         self._cache_dir = cache_dir
         self._config = config
+        self._expiries = []
         self._failures = {}
         self._logger = logger
+        self._missing = OrderedDict()
         self._pool = _Pool(logger)
         self._services = services
+        self._stats = {}
+        self._store = store
         self._temp_dir = temp_dir
+        self._unsaved = set()
+
+        cutoff = time() - FAILURE_CACHE_SECS
+        store.expire('failure', cutoff)
+        for path, value, when in store.load('failure', cutoff):
+            try:
+                kind, message = json.loads(value)
+            except ValueError:
+                continue
+            self._failures[path] = when, kind, message
+            heappush(self._expiries, (when, path))
+        self._failures_expire()
+
+        cutoff = time() - DICTIONARY_MISS_SECS
+        store.expire('bloom', cutoff)
+        store.expire('missing', cutoff)
+        for svc_id, value, when in store.load('bloom', cutoff):
+            try:
+                self._blooms[svc_id] = _Bloom.loads(value, when)
+            except (TypeError, ValueError):
+                continue
+        for key, svc_id, when in store.load('missing', cutoff):
+            self._missing[key] = when
+
+            # filters are only saved now and then, so any words missed
+            # since the last save (e.g. before a crash) are added back
+            bloom = self._blooms.get(svc_id)
+            if not bloom:
+                bloom = self._blooms[svc_id] = _Bloom(when)
+            if when >= bloom.created and key not in bloom:
+                bloom.add(key)
+                self._unsaved.add(svc_id)
+        self._misses_expire()
+        self.save_misses()
 
     def by_trait(self, trait):
         """
@@ -211,6 +310,17 @@ class Router(object):
             except Exception:  # catch all, pylint:disable=broad-except
                 service['desc'] = svc_id + " service"
 
+        breaker = self._breakers.get(svc_id)
+        if breaker and breaker['opened']:
+            return "%s\n\nCurrently unreachable (%s); AwesomeTTS is %s." % (
+                service['desc'],
+                "%d network errors in a row" % breaker['errors'],
+                "checking whether it is back" if breaker['probing']
+                else "skipping it for now and will check again in %d "
+                "seconds" % max(BREAKER_PROBE_SECS -
+                                (time() - breaker['opened']), 0),
+            )
+
         return service['desc']
 
     def get_options(self, svc_id):
@@ -237,20 +347,161 @@ class Router(object):
         entries from the cache.
         """
 
-        now = time()
-        for path, (when, _) in self._failures.items():
-            if now - when > FAILURE_CACHE_SECS:
-                del self._failures[path]
-
+        self._failures_expire()
         return len(self._failures)
 
     def forget_failures(self):
-        """Delete the cache of remembered failures."""
+        """Delete the cache of remembered failures and reset breakers."""
 
+        self._expiries = []
         self._failures = {}
+        self._store.delete('failure')
+        self._breakers = {}
+
+    def get_miss_count(self):
+        """
+        Returns the number of words that dictionary services are known
+        to be missing, after dumping any expired entries.
+        """
+
+        self._misses_expire()
+        return sum(bloom.count for bloom in self._blooms.values())
+
+    def forget_misses(self):
+        """Delete the remembered words that dictionary services lack."""
+
+        self._blooms = {}
+        self._missing = OrderedDict()
+        self._unsaved = set()
+        self._store.delete('bloom')
+        self._store.delete('missing')
+
+    def save_misses(self):
+        """
+        Saves the Bloom filters of any dictionary services that have
+        missed words since their filters were last saved, e.g. as the
+        profile is closed.
+        """
+
+        unsaved, self._unsaved = self._unsaved, set()
+        for svc_id in unsaved:
+            bloom = self._blooms.get(svc_id)
+            if bloom:
+                self._store.put('bloom', svc_id, bloom.dumps(),
+                                bloom.created)
+
+    def get_path(self, svc_id, text, options):
+        """
+        Returns the cache path that a call with the given service ID,
+        text, and options would use, without actually running anything.
+
+        The same validation and service-specific modify() normalization
+        as a regular call is applied, so any problem with the request is
+        raised as an exception here.
+        """
+
+        return self._parse(svc_id, text, options)[3]
+
+    def get_estimate(self, svc_id, text, options):
+        """
+        Returns a dict describing what a call with the given service ID,
+        text, and options would cost, without actually running anything:
+
+            - 'svc_id': normalized service ID
+            - 'hit': True if the audio is already in the cache
+            - 'segments': number of pieces the text would be split into
+            - 'requests': approximate number of network requests
+            - 'transcodes': approximate number of LAME runs
+            - 'seconds': approximate wall-clock time, excluding throttling
+            - 'measured': True if the figures are based on timings taken
+              from this session rather than rough defaults
+
+        Any problem with the request is raised as an exception.
+        """
+
+        svc_id, service, text, path, _ = self._parse(svc_id, text, options)
+
+        if os.path.exists(path):
+            return dict(svc_id=svc_id, hit=True, segments=0, requests=0,
+                        transcodes=0, seconds=0.0, measured=True)
+
+        segments = service['instance'].util_segments(text)
+        traits = service['class'].TRAITS
+        stats = self._stats.get(svc_id)
+
+        if stats and stats['segments']:
+            per_segment = {key: float(stats[key]) / stats['segments']
+                           for key in ['requests', 'seconds']}
+        else:
+            per_segment = ESTIMATE_DEFAULTS[
+                'online' if BaseTrait.INTERNET in traits else 'local'
+            ]
+
+        return dict(
+            svc_id=svc_id,
+            hit=False,
+            segments=segments,
+            requests=int(round(segments * per_segment['requests'])),
+            # segments are joined before LAME runs, see cli_transcode_segments
+            transcodes=1 if BaseTrait.TRANSCODING in traits else 0,
+            seconds=segments * per_segment['seconds'],
+            measured=bool(stats),
+        )
+
+    def get_group_estimate(self, text, group, presets):
+        """
+        Returns get_estimate() for the preset that a group() call for
+        the text would try first, i.e. the first usable one in ordered
+        mode or, if the group is randomized or prefers cached audio, the
+        first usable one with cached audio, if any.
+
+        Raises ValueError if none of the presets in the group are usable.
+        """
+
+        presets = [dict(presets[name]) for name in group.get('presets') or []
+                   if presets.get(name)]
+        if group.get('mode') == 'random' or group.get('prefer_cached'):
+            presets = self._cached_first(text, presets)
+
+        for preset in presets:
+            try:
+                return self.get_estimate(preset.pop('service'), text, preset)
+            except Exception:  # catch all, pylint:disable=broad-except
+                continue
+
+        raise ValueError("None of the presets in this group are usable")
+
+    def get_group_path(self, text, group, presets):
+        """
+        Returns the cache path of the audio that the given group would
+        give for the text, i.e. that of the first preset, in group order,
+        whose audio is already cached or, if there is none, that of the
+        first one. Presets that would not be able to process the text
+        are silently skipped, and None is returned if that is all of
+        them.
+        """
+
+        paths = []
+
+        for name in group.get('presets') or []:
+            preset = presets.get(name)
+            if not preset:
+                continue
+
+            preset = dict(preset)
+            try:
+                path = self.get_path(preset.pop('service'), text, preset)
+            except Exception:  # catch all, pylint:disable=broad-except
+                continue
+
+            if os.path.exists(path):
+                return path
+            paths.append(path)
+
+        return paths[0] if paths else None
 
     def group(self, text, group, presets, callbacks,
-              want_human=False, note=None):
+              want_human=False, note=None, background=False):
         """
         Execute a group playback request using the passed group to be
         looked up using the passed presets.
@@ -262,6 +513,16 @@ class Router(object):
         how the caller wants the filename in the path to be formatted.
         Additionally, note may be passed to provide mustache values for
         the given template string.
+
+        If background is set, any service calls are run at low priority.
+
+        Presets whose audio for the text is already cached are tried
+        first in randomized mode, and in ordered mode if the group has
+        'prefer_cached' set, so that a cache hit is played right away
+        rather than after the higher-priority presets fail or finish.
+
+        If an ordered group has 'hedge' set (in seconds), the presets are
+        run in parallel as described in _hedged().
         """
 
         self._call_assert_callbacks(callbacks)
@@ -282,6 +543,9 @@ class Router(object):
             if mode == 'random':  # shuffle (but allow duplicates to weight)
                 shuffle(presets)
 
+            if mode == 'random' or group.get('prefer_cached'):
+                presets = self._cached_first(text, presets)
+
         except Exception as exception:  # all, pylint:disable=broad-except
             if 'done' in callbacks:
                 callbacks['done']()
@@ -290,6 +554,12 @@ class Router(object):
                 callbacks['then']()
 
         else:
+            if mode == 'ordered' and group.get('hedge') is not None:
+                self._hedged(text, presets, callbacks, group['hedge'],
+                             group.get('hedge_grace', HEDGE_GRACE_SECS),
+                             want_human, note, background)
+                return
+
             def on_okay(path):
                 """Executes caller callbacks with path."""
                 if 'done' in callbacks:
@@ -331,12 +601,159 @@ class Router(object):
                     svc_id = preset.pop('service')
                     self(svc_id=svc_id, text=text, options=preset,
                          callbacks=internal_callbacks,
-                         want_human=want_human, note=note)
+                         want_human=want_human, note=note,
+                         background=background)
 
             try_next()
 
+    def _hedged(self, text, presets, callbacks, hedge, grace,
+                want_human, note, background):
+        """
+        Runs the presets of an ordered group, starting the next one
+        whenever the running ones have all failed or after every hedge
+        seconds without a success, whichever is first.
+
+        The first success is passed on right away if all of the presets
+        ahead of it have already failed. Otherwise, the presets ahead of
+        it get up to grace more seconds, and the highest-priority success
+        by then wins. Everything else still running at that point is
+        ignored (the services cannot be interrupted, but their audio
+        still lands in the cache).
+
+        The presets are run without want_human, which is only applied to
+        the winner's audio, and a 'miss' is only passed on for calls that
+        finish before the winner is known.
+        """
+
+        state = dict(
+            finished=False,
+            grace_timer=False,
+            results={},  # index -> (True, path) or (False, exception)
+            started=0,
+        )
+
+        def finish(success, value, index=None):
+            """Executes caller callbacks, just once."""
+
+            state['finished'] = True
+
+            if success and want_human:
+                # from the cache, making the human-readable copy
+                preset = dict(presets[index])
+                self(svc_id=preset.pop('service'), text=text,
+                     options=preset, callbacks=callbacks,
+                     want_human=want_human, note=note, background=background)
+                return
+
+            if 'done' in callbacks:
+                callbacks['done']()
+            (callbacks['okay'] if success else callbacks['fail'])(value)
+            if 'then' in callbacks:
+                callbacks['then']()
+
+        def best():
+            """Returns the index of the highest-priority success, if any."""
+
+            return next((index for index in sorted(state['results'])
+                         if state['results'][index][0]), None)
+
+        def settle():
+            """Finishes if the winner is known; otherwise keeps going."""
+
+            if state['finished']:
+                return
+
+            results = state['results']
+            winner = best()
+
+            if winner is not None:
+                if all(index in results for index in range(winner)):
+                    finish(True, results[winner][1], winner)
+
+                elif not state['grace_timer']:
+                    state['grace_timer'] = True
+                    QtCore.QTimer.singleShot(
+                        int(grace * 1000),
+                        lambda: state['finished'] or
+                        finish(True, results[best()][1], best()),
+                    )
+
+            elif len(results) == len(presets):
+                finish(False, IndexError(
+                    "None of the presets in this group were able to play "
+                    "the input text."
+                ))
+
+            elif len(results) == state['started']:
+                start_next()
+
+        def start_next():
+            """Starts the next preset and schedules the one after it."""
+
+            if state['finished'] or state['started'] == len(presets) or \
+                    best() is not None:  # presets after a success cannot win
+                return
+
+            index = state['started']
+            state['started'] += 1
+
+            def on_okay(path):
+                """Records the success."""
+                state['results'][index] = True, path
+                settle()
+
+            def on_fail(exception):
+                """Records the failure, which only rules out this preset."""
+                state['results'][index] = False, exception
+                settle()
+
+            preset_callbacks = dict(okay=on_okay, fail=on_fail)
+            if 'miss' in callbacks:
+                preset_callbacks['miss'] = lambda *args: (
+                    state['finished'] or callbacks['miss'](*args)
+                )
+
+            preset = dict(presets[index])
+            svc_id = preset.pop('service')
+            self(svc_id=svc_id, text=text, options=preset,
+                 callbacks=preset_callbacks, note=note,
+                 background=background)
+
+            if not state['finished'] and state['started'] < len(presets):
+                QtCore.QTimer.singleShot(
+                    int(hedge * 1000),
+                    lambda: state['started'] == index + 1 and start_next(),
+                )
+
+        start_next()
+
+    def _cached_first(self, text, presets):
+        """
+        Returns the presets with those that already have audio for the
+        text in the cache moved to the front, keeping the relative order
+        within the cached ones and within the others.
+        """
+
+        cached = []
+        uncached = []
+
+        for preset in presets:
+            options = dict(preset)
+            try:
+                hit = os.path.exists(self.get_path(options.pop('service'),
+                                                   text, options))
+            except Exception:  # catch all, pylint:disable=broad-except
+                hit = False
+            (cached if hit else uncached).append(preset)
+
+        if cached and uncached:
+            self._logger.debug("%d of %d group preset(s) have cached audio",
+                               len(cached), len(presets))
+
+        return cached + uncached
+
     def __call__(self, svc_id, text, options, callbacks,
-                 want_human=False, note=None):
+                 want_human=False, note=None, background=False):
         """
         Given the service ID and associated options, pass the text into
         the service for processing.
@@ -361,6 +778,12 @@ class Router(object):
             - 'fail' (required): called with an exception for validation
                errors or failed service calls occurs
             - 'then' (optional): called after the okay/fail callback
+            - 'part' (optional): if the text is not cached and the service
+               splits it into several segments, called with the path of
+               each segment, in order, as soon as it is ready; 'okay' is
+               then still called with the merged file, so a caller that
+               played the parts can ignore it (and likewise 'fail', if
+               merging the parts fails after all of them were ready)
 
         Because it is asynchronous in nature, this method does not raise
         exceptions normally; they are passed to callbacks['fail'].
@@ -381,21 +804,43 @@ class Router(object):
         how the caller wants the filename in the path to be formatted.
         Additionally, note may be passed to provide mustache values for
         the given template string.
+
+        If background is set (e.g. when warming the cache ahead of time),
+        the service is run in a thread with the lowest priority.
+
+        A call for a file that is already in progress is made again once
+        that finishes, unless both calls are in the foreground, in which
+        case the later one fails with a BusyError.
         """
 
         self._call_assert_callbacks(callbacks)
 
         try:
             self._logger.debug("Call for '%s' w/ %s", svc_id, options)
+            request = dict(svc_id=svc_id, text=text, options=dict(options),
+                           callbacks=callbacks, want_human=want_human,
+                           note=note, background=background)
+
+            svc_id, service, text, path, options = \
+                self._parse(svc_id, text, options)
+            if path in self._busy:
+                busy_background, waiters = self._busy[path]
+                if not (busy_background or background):
+                    # e.g. replay pressed again while the first is underway
+                    raise self.BusyError(
+                        "The '%s' service is already busy processing %s." %
+                        (svc_id, path)
+                    )
 
-            if not text:
-                raise ValueError("No speakable text is present")
-            svc_id, service, options = self._validate_service(svc_id, options)
-            text = service['instance'].modify(text)
-            if not text:
-                raise ValueError("Text not usable by " + service['class'].NAME)
-            path = self._validate_path(svc_id, text, options)
+                # e.g. playback of a card whose audio is being prefetched;
+                # once that is done, this call is made again (and hits the
+                # cache or the failure cache, or runs the service itself)
+                self._logger.debug("Waiting on %s, which is in progress",
+                                   path)
+                waiters.append(lambda: self(**request))
+                return
             cache_hit = os.path.exists(path)
+            segment_options = dict(options)  # before any extras are added
 
             self._logger.debug(
                 "Parsed call to '%s' w/ %s and \"%s\" at %s (cache %s)",
@@ -504,7 +949,38 @@ class Router(object):
               time() - self._failures[path][0] < FAILURE_CACHE_SECS):
             if 'done' in callbacks:
                 callbacks['done']()
-            callbacks['fail'](self._failures[path][1])
+            _, kind, message = self._failures[path]
+            exception = self.RememberedError(message)
+            exception.kind = kind
+            callbacks['fail'](exception)
+            if 'then' in callbacks:
+                callbacks['then']()
+
+        elif self._misses_known(svc_id, service, path):
+            if 'done' in callbacks:
+                callbacks['done']()
+            callbacks['fail'](self.MissingError(
+                "The %s service is known not to have audio for this input. "
+                "Use \"Forget Missing Words\" in the configuration to look "
+                "it up again." % service['name']
+            ))
+            if 'then' in callbacks:
+                callbacks['then']()
+
+        elif 'part' in callbacks and not want_human and \
+                service['instance'].util_segments(text) > 1:
+            self._progressive(svc_id, service, text, segment_options, path,
+                              callbacks, background)
+
+        elif self._breaker_blocks(svc_id, service):
+            if 'done' in callbacks:
+                callbacks['done']()
+            callbacks['fail'](self.TrippedError(
+                "The %s service failed to connect %d times in a row, so it "
+                "is being skipped for now. It will be tried again in a "
+                "little while." %
+                (service['name'], self._breakers[svc_id]['errors'])
+            ))
             if 'then' in callbacks:
                 callbacks['then']()
 
@@ -522,26 +998,38 @@ class Router(object):
                    not isinstance(exception, IncompleteRead) and \
                    not isinstance(exception, SocketError) and \
                    not isinstance(exception, URLError):
-                    self._failures[path] = time(), exception
+                    self._failures_add(path, exception)
+                if BaseTrait.DICTIONARY in service['class'].TRAITS and \
+                   isinstance(exception, service['class'].NotFoundError):
+                    self._misses_add(svc_id, path)
                 callbacks['fail'](exception)
 
-            service['instance'].net_reset()
-            self._busy.append(path)
+            self._busy[path] = background, []
+            timing = {}  # start time and request count of this call's run
 
             def completion_callback(exception):
                 """Intermediate callback handler for all service calls."""
 
-                self._busy.remove(path)
+                _, waiters = self._busy.pop(path)
 
                 if 'done' in callbacks:
                     callbacks['done']()
 
                 if 'miss' in callbacks:
-                    callbacks['miss'](svc_id, service['instance'].net_count())
+                    callbacks['miss'](svc_id, timing.get('requests', 0))
+
+                self._breaker_update(svc_id, service, exception)
+
+                if not exception and os.path.exists(path):
+                    exception = self._invalid(path)
 
                 if exception:
                     on_error(exception)
                 elif os.path.exists(path):
+                    if 'start' in timing:
+                        self._measure(svc_id, service, text,
+                                      timing.get('requests', 0),
+                                      time() - timing['start'])
                     callbacks['okay'](human(path))
                 else:
                     on_error(RuntimeError(
@@ -552,11 +1040,26 @@ class Router(object):
                 if 'then' in callbacks:
                     callbacks['then']()
 
+                for waiter in waiters:
+                    waiter()
+
+            def task():
+                """Runs the service, counting the requests of this run."""
+                instance = service['instance']
+                instance.net_reset()  # counts are kept per thread
+                try:
+                    instance.run(text, options, path)
+                finally:
+                    timing['requests'] = instance.net_count()
+
             def do_spawn():
                 """Call if ready to start a thread to run the service."""
+                timing['start'] = time()
                 self._pool.spawn(
-                    task=lambda: service['instance'].run(text, options, path),
+                    task=task,
                     callback=completion_callback,
+                    priority=(QtCore.QThread.LowestPriority if background
+                              else QtCore.QThread.InheritPriority),
                 )
 
             if hasattr(service['instance'], 'prerun'):
@@ -581,6 +1084,292 @@ class Router(object):
             else:
                 do_spawn()
 
+    def _progressive(self, svc_id, service, text, options, path, callbacks,
+                     background):
+        """
+        Runs each of the service's segments for the text as a call of
+        its own (so each is cached and can be passed to 'part' as soon
+        as it is ready), then merges them into path for 'okay'.
+        """
+
+        subtexts = service['instance'].util_split(
+            text,
+            service['instance'].SPLIT_LIMIT,
+        )
+        paths = []
+        failure = {}
+        self._busy[path] = background, []
+
+        def finish():
+            """Merges the segments and executes the caller callbacks."""
+
+            _, waiters = self._busy.pop(path)
+
+            if 'done' in callbacks:
+                callbacks['done']()
+
+            if 'exception' not in failure:
+                # merged next to the cache path (rather than in the temp
+                # directory, which may be on another file system) so that
+                # only a complete and valid file is ever renamed into it
+                merging_path = path + '.merging'
+                try:
+                    service['instance'].util_merge(paths, merging_path)
+                    mp3.validate(merging_path)
+                    os.rename(merging_path, path)
+                except Exception as exception:  # all, pylint:disable=W0703
+                    self._logger.warn("Cannot merge the segments of %s: %s",
+                                      path, exception)
+                    service['instance'].path_unlink(merging_path)
+                    failure['exception'] = exception
+
+            if 'exception' in failure:
+                callbacks['fail'](failure['exception'])
+            else:
+                callbacks['okay'](path)
+
+            if 'then' in callbacks:
+                callbacks['then']()
+
+            for waiter in waiters:
+                waiter()
+
+        def on_okay(segment_path):
+            """Passes the segment on to the caller as soon as it is ready."""
+
+            paths.append(segment_path)
+            callbacks['part'](segment_path)
+
+        def on_fail(exception):
+            """Remembers the exception so that the segments stop."""
+
+            failure['exception'] = exception
+
+        def next_segment():
+            """Starts the next segment, or finishes if there are no more."""
+
+            if 'exception' in failure or len(paths) == len(subtexts):
+                finish()
+                return
+
+            segment_callbacks = dict(okay=on_okay, fail=on_fail,
+                                     then=next_segment)
+            if 'miss' in callbacks:
+                segment_callbacks['miss'] = callbacks['miss']
+
+            self(svc_id=svc_id, text=subtexts[len(paths)],
+                 options=dict(options), callbacks=segment_callbacks,
+                 background=background)
+
+        next_segment()
+
+    def _failures_add(self, path, exception):
+        """
+        Remembers the failure for the path, keeping just the name of the
+        exception's class and its message (which is truncated), rather
+        than the exception itself (which might hold whole payloads).
+        """
+
+        when = time()
+        kind = type(exception).__name__
+        message = getattr(exception, 'message', None)
+        if not (message and isinstance(message, basestring)):
+            try:
+                message = unicode(exception)
+            except UnicodeError:
+                message = repr(exception)
+        if isinstance(message, str):
+            message = message.decode('utf-8', 'replace')
+        if len(message) > FAILURE_MESSAGE_MAX:
+            message = message[:FAILURE_MESSAGE_MAX - 3] + '...'
+
+        self._failures[path] = when, kind, message
+        heappush(self._expiries, (when, path))
+        self._store.put('failure', path, json.dumps([kind, message]), when)
+        self._failures_expire()
+
+    def _failures_expire(self):
+        """
+        Drops failures that are too old or that are beyond the size cap,
+        oldest first. Entries are taken off the heap in time order, so
+        this does not need to look at the failures that are kept.
+        """
+
+        cutoff = time() - FAILURE_CACHE_SECS
+        expiries = self._expiries
+        failures = self._failures
+        dropped = []
+
+        while expiries and (expiries[0][0] < cutoff or
+                            len(failures) > FAILURE_CACHE_SIZE):
+            when, path = heappop(expiries)
+            if path in failures and failures[path][0] == when:
+                del failures[path]  # otherwise, a newer failure replaced it
+                dropped.append(path)
+
+        if dropped:
+            self._store.delete('failure', dropped)
+
+    def _invalid(self, path):
+        """
+        Checks that a file that a service has just written is a usable
+        MP3 (see mp3.validate()). If not, the file is removed, so that
+        it is never served from the cache, and the exception is returned
+        so that the call fails (and gets retried later) instead.
+        """
+
+        try:
+            mp3.validate(path)
+        except (EnvironmentError, mp3.InvalidError) as exception:
+            self._logger.warn("Discarding %s: %s", path, exception)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return exception
+
+        return None
+
+    def _misses_add(self, svc_id, path):
+        """
+        Remembers that the dictionary service does not have the word for
+        the path, both in the service's Bloom filter (which can hold many
+        words compactly) and exactly in the list of recent misses.
+
+        Only the word's own row is stored right away; the filter is saved
+        when a new one is started, or DICTIONARY_MISS_SAVE_SECS later.
+        """
+
+        when = time()
+        key = os.path.basename(path)
+
+        bloom = self._blooms.get(svc_id)
+        if not bloom or bloom.count >= DICTIONARY_MISS_LIMIT:
+            bloom = self._blooms[svc_id] = _Bloom(when)
+            bloom.add(key)
+            self._unsaved.discard(svc_id)
+            self._store.put('bloom', svc_id, bloom.dumps(), bloom.created)
+        else:
+            bloom.add(key)
+            if not self._unsaved:
+                QtCore.QTimer.singleShot(DICTIONARY_MISS_SAVE_SECS * 1000,
+                                         self.save_misses)
+            self._unsaved.add(svc_id)
+
+        self._missing.pop(key, None)
+        self._missing[key] = when
+        self._store.put('missing', key, svc_id, when)
+        self._misses_expire()
+
+    def _misses_known(self, svc_id, service, path):
+        """
+        Returns True if the dictionary service is known to be missing
+        the word for the path, from the recent misses or, for words
+        missed longer ago, from the service's Bloom filter.
+        """
+
+        if BaseTrait.DICTIONARY not in service['class'].TRAITS:
+            return False
+
+        self._misses_expire()
+        key = os.path.basename(path)
+        if key in self._missing:
+            return True
+
+        bloom = self._blooms.get(svc_id)
+        return bool(bloom and key in bloom)
+
+    def _misses_expire(self):
+        """
+        Drops Bloom filters started more than DICTIONARY_MISS_SECS ago,
+        and recent misses that are too old or beyond the size cap. The
+        stored rows of misses beyond the cap are kept until they are too
+        old, as the filters are rebuilt from them when loading.
+        """
+
+        cutoff = time() - DICTIONARY_MISS_SECS
+
+        for svc_id, bloom in self._blooms.items():
+            if bloom.created < cutoff:
+                del self._blooms[svc_id]
+
+        missing = self._missing
+        while missing:
+            key, when = next(missing.iteritems())
+            if when >= cutoff and len(missing) <= DICTIONARY_MISS_RECENT:
+                break
+            del missing[key]
+
+    def _breaker_blocks(self, svc_id, service):
+        """
+        Returns True if the service's circuit breaker is tripped and the
+        call should fail right away. Once BREAKER_PROBE_SECS have passed
+        since the breaker tripped, a single call is let through (and
+        False is returned) to probe whether the service is back.
+        """
+
+        if BaseTrait.INTERNET not in service['class'].TRAITS:
+            return False
+
+        breaker = self._breakers.get(svc_id)
+        if not (breaker and breaker['opened']):
+            return False
+
+        if breaker['probing'] or \
+                time() - breaker['opened'] < BREAKER_PROBE_SECS:
+            return True
+
+        self._logger.info("Probing whether %s is reachable again", svc_id)
+        breaker['probing'] = True
+        return False
+
+    def _breaker_update(self, svc_id, service, exception):
+        """
+        Records the outcome of a service call for the circuit breaker.
+        Network errors count toward tripping it (or trip it again, for a
+        probe), and anything else shows that the service is reachable.
+        """
+
+        if BaseTrait.INTERNET not in service['class'].TRAITS:
+            return
+
+        if not isinstance(exception, (IncompleteRead, SocketError,
+                                      URLError)):
+            if svc_id in self._breakers:
+                self._logger.info("%s is reachable; resetting breaker",
+                                  svc_id)
+                del self._breakers[svc_id]
+            return
+
+        breaker = self._breakers.setdefault(
+            svc_id,
+            dict(errors=0, opened=None, probing=False),
+        )
+        breaker['errors'] += 1
+
+        if breaker['probing'] or breaker['errors'] >= BREAKER_THRESHOLD:
+            self._logger.warn("%s failed to connect %d time(s) in a row; "
+                              "tripping breaker", svc_id, breaker['errors'])
+            breaker['opened'] = time()
+            breaker['probing'] = False
+
+    def _measure(self, svc_id, service, text, requests, seconds):
+        """
+        Records how many segments and network requests a successful run
+        of the service took and how long it was, for get_estimate().
+        """
+
+        try:
+            stats = self._stats[svc_id]
+        except KeyError:
+            stats = self._stats[svc_id] = dict(runs=0, segments=0,
+                                               requests=0, seconds=0.0)
+
+        stats['runs'] += 1
+        stats['segments'] += service['instance'].util_segments(text)
+        stats['requests'] += requests
+        stats['seconds'] += seconds
+
     def _call_assert_callbacks(self, callbacks):
         """Checks the callbacks argument for validity."""
 
@@ -589,6 +1378,7 @@ class Router(object):
         assert 'okay' in callbacks and callable(callbacks['okay'])
         assert 'fail' in callbacks and callable(callbacks['fail'])
         assert 'then' not in callbacks or callable(callbacks['then'])
+        assert 'part' not in callbacks or callable(callbacks['part'])
 
     def _validate_service(self, svc_id, options):
         """
@@ -688,21 +1478,27 @@ class Router(object):
 
         return problems
 
-    def _validate_path(self, svc_id, text, options):
+    def _parse(self, svc_id, text, options):
         """
         Given the service ID, its associated options, and the desired
-        text, generate a cache path. If the file is already being
-        processed, raise a BusyError.
+        text, validates everything and returns the following:
+
+            - 0th: normalized service ID
+            - 1st: service lookup dict
+            - 2nd: text, after the service's modify() has been applied
+            - 3rd: cache path
+            - 4th: options, normalized and defaults filled in
         """
 
-        path = self._path_cache(svc_id, text, options)
-        if path in self._busy:
-            raise self.BusyError(
-                "The '%s' service is already busy processing %s." %
-                (svc_id, path)
-            )
+        if not text:
+            raise ValueError("No speakable text is present")
+        svc_id, service, options = self._validate_service(svc_id, options)
+        text = service['instance'].modify(text)
+        if not text:
+            raise ValueError("Text not usable by " + service['class'].NAME)
 
-        return path
+        return (svc_id, service, text,
+                self._path_cache(svc_id, text, options), options)
 
     def _fetch_options_and_extras(self, svc_id):
         """
@@ -903,10 +1699,10 @@ class _Pool(QtGui.QWidget):
         self._logger = logger
         self._threads = {}
 
-    def spawn(self, task, callback):
+    def spawn(self, task, callback, priority=QtCore.QThread.InheritPriority):
         """
-        Create a worker thread for the given task. When the thread
-        completes, the callback will be called.
+        Create a worker thread for the given task, running at the given
+        priority. When the thread completes, the callback will be called.
         """
 
         self._current_id += 1
@@ -919,7 +1715,7 @@ class _Pool(QtGui.QWidget):
 
         self.connect(thread['worker'], _SIGNAL, self._on_worker_signal)
         thread['worker'].finished.connect(self._on_worker_finished)
-        thread['worker'].start()
+        thread['worker'].start(priority)
 
         self._logger.debug(
             "Spawned thread [%d]; pool=%s",
@@ -1017,3 +1813,60 @@ class _Worker(QtCore.QThread):
             return
 
         self.emit(_SIGNAL, self._id)
+
+
+class _Bloom(object):
+    """
+    Records keys in a fixed-size bit array so that they can be tested
+    for later without keeping the keys themselves. A test never misses
+    a key that was added, but may (rarely, unless the filter is nearly
+    full) report one that was not.
+    """
+
+    __slots__ = [
+        'bits',     # bytearray of DICTIONARY_MISS_BITS bits
+        'count',    # number of keys added so far
+        'created',  # timestamp of when the filter was started
+    ]
+
+    def __init__(self, created, count=0, bits=None):
+        self.bits = bits or bytearray(DICTIONARY_MISS_BITS // 8)
+        self.count = count
+        self.created = created
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def add(self, key):
+        """Sets the bits for the key."""
+
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def dumps(self):
+        """Returns a string with the count and bits, for storage."""
+
+        return json.dumps([self.count, b64encode(str(self.bits))])
+
+    @classmethod
+    def loads(cls, value, created):
+        """Returns a filter from the dumps() string of another one."""
+
+        count, bits = json.loads(value)
+        bits = bytearray(b64decode(bits))
+        if len(bits) != DICTIONARY_MISS_BITS // 8:
+            raise ValueError("Stored filter is of the wrong size")
+        return cls(created, count, bits)
+
+    @staticmethod
+    def _positions(key):
+        """Derives the key's bit positions from two halves of a hash."""
+
+        first, second = unpack('>QQ', sha1(key.encode('utf-8')).digest()[:16])
+        second |= 1
+        return [(first + i * second) % DICTIONARY_MISS_BITS
+                for i in range(DICTIONARY_MISS_HASHES)]
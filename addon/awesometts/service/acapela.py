@@ -91,6 +91,8 @@ assert len(LANGS) == len(VOICES)
 
 FORM_ENDPOINT = 'http://www.acapela-group.com/demo-tts/DemoHTML5Form_V2.php'
 
+URL_SECS = 600  # how long an MP3 URL from the form is remembered
+
 RE_MP3 = re_compile(r'https?://[-\w]+\.acapela-group\.com/[-\w/]+\.mp3')
 
 REQUIRE_MP3 = dict(mime='audio/mpeg', size=256)
@@ -108,6 +110,8 @@ class Acapela(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 300  # see `maxlength` on site
+
     def desc(self):
         """Returns service name with a voice count."""
 
@@ -144,11 +148,8 @@ class Acapela(Service):
 
         long_voice_name = VOICES[options['voice']][0]
 
-        def fetch_piece(subtext, subpath):
-            """
-            Gets the MP3 URL for the given subtext and downloads it to
-            the given subpath.
-            """
+        def resolve(subtext):
+            """Gets the MP3 URL for the given subtext."""
 
             payload = self.net_stream(
                 (
@@ -163,19 +164,23 @@ class Acapela(Service):
                 method='POST',
             )
             match = RE_MP3.search(payload)
-            match = match.group(0)
-            self.net_download(subpath, match, require=REQUIRE_MP3)
+            return match.group(0)
+
+        def fetch(url, subtext, subpath):  # pylint:disable=unused-argument
+            """Downloads the MP3 URL to the given subpath."""
+
+            self.net_download(subpath, url, require=REQUIRE_MP3)
+
+        pipeline = dict(resolve=resolve, fetch=fetch, lifetime=URL_SECS,
+                        key=lambda subtext: long_voice_name + '/' + subtext)
 
-        subtexts = self.util_split(text, 300)  # see `maxlength` on site
+        subtexts = self.util_split(text, self.SPLIT_LIMIT)
         if len(subtexts) == 1:
-            fetch_piece(text, path)
+            self.net_pipeline(subtexts, [path], **pipeline)
         else:
-            intermediate_mp3s = []
+            intermediate_mp3s = [self.path_temp('mp3') for _ in subtexts]
             try:
-                for subtext in subtexts:
-                    intermediate_mp3 = self.path_temp('mp3')
-                    intermediate_mp3s.append(intermediate_mp3)
-                    fetch_piece(subtext, intermediate_mp3)
+                self.net_pipeline(subtexts, intermediate_mp3s, **pipeline)
                 self.util_merge(intermediate_mp3s, path)
             finally:
                 self.path_unlink(intermediate_mp3s)
@@ -50,6 +50,8 @@ class Baidu(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 300
+
     def desc(self):
         """Returns a short, static description."""
 
@@ -77,7 +79,7 @@ class Baidu(Service):
             [
                 ('http://tts.baidu.com/text2audio',
                  dict(text=subtext, lan=options['voice'], ie='UTF-8'))
-                for subtext in self.util_split(text, 300)
+                for subtext in self.util_split(text, self.SPLIT_LIMIT)
             ],
             require=dict(mime='audio/mp3', size=512),
         )
@@ -30,6 +30,10 @@ import os
 import shutil
 import sys
 import subprocess
+from threading import local
+import wave
+
+from . import mp3
 
 __all__ = ['Service']
 
@@ -39,6 +43,8 @@ DEFAULT_TIMEOUT = 15
 
 PADDING = '\0' * 2**11
 
+WAV_FRAMES = 2**16  # frames copied at a time when joining WAV files
+
 
 class Service(object):
     """
@@ -63,14 +69,20 @@ class Service(object):
 
     __metaclass__ = abc.ABCMeta
 
+    InvalidMP3Error = mp3.InvalidError
+
+    class NotFoundError(IOError):
+        """Raised by dictionary services that have no audio for a word."""
+
     class TinyDownloadError(ValueError):
         """Raises when a download is too small."""
 
     __slots__ = [
-        '_netops',      # number of network ops required by the last run
+        '_netops',      # thread-local count of the network ops of a run
         '_lame_flags',  # callable to get flag string for LAME transcoder
         '_logger',      # logging interface with debug(), info(), etc.
         'normalize',    # callable for standardizing string values
+        '_store',       # persistent Store, for remembering resolved values
         '_temp_dir',    # for temporary scratch space
         'ecosystem',    # get information about web API, user agent
     ]
@@ -124,6 +136,12 @@ class Service(object):
 
     SPLIT_MINIMUM = 5
 
+    # how long net_resolved() remembers a value by default (one week)
+    RESOLVE_SECS = 7 * 86400
+
+    # most segments that net_pipeline() resolves at the same time
+    PIPELINE_THREADS = 3
+
     # abstract; to be overridden by the concrete classes
     # e.g. NAME = "ABC Service API"
     NAME = None
@@ -132,7 +150,13 @@ class Service(object):
     # e.g. TRAITS = [Trait.INTERNET, Trait.TRANSCODING]
     TRAITS = None
 
-    def __init__(self, temp_dir, lame_flags, normalize, logger, ecosystem):
+    # optional; concrete classes that break long input up into several
+    # requests using util_split() should advertise their limit here
+    # e.g. SPLIT_LIMIT = 300
+    SPLIT_LIMIT = None
+
+    def __init__(self, temp_dir, lame_flags, normalize, logger, ecosystem,
+                 store):
         """
         Attempt to initialize the service, raising a exception if the
         service cannot be used. If the service needs to make any calls
@@ -154,16 +178,20 @@ class Service(object):
         The logger object should have an interface like the one used by
         the standard library logging module, with debug(), info(), and
         so on, available.
+
+        The store should be a Store instance, which net_resolved() uses
+        to remember values (e.g. audio URLs) across sessions.
         """
 
         assert self.NAME, "Please specify a NAME for the service"
         assert isinstance(self.TRAITS, list), \
             "Please specify a TRAITS list for the service"
 
-        self._netops = None
+        self._netops = local()
         self._lame_flags = lame_flags
         self._logger = logger
         self.normalize = normalize
+        self._store = store
         self._temp_dir = temp_dir
         self.ecosystem = ecosystem
 
@@ -371,21 +399,7 @@ class Service(object):
         that the generated MP3 will not be clipped by `mplayer`.
         """
 
-        if not os.path.exists(input_path):
-            raise RuntimeError(
-                "The input file to transcode to an MP3 could not be found. "
-                "Please report this problem if it persists."
-            )
-
-        if require and 'size_in' in require and \
-           os.path.getsize(input_path) < require['size_in']:
-            raise ValueError(
-                "Input to transcoder was %d-byte stream; wanted %d+ bytes "
-                "(the service might not have liked your input text)" % (
-                    os.path.getsize(input_path),
-                    require['size_in'],
-                )
-            )
+        self._cli_transcode_check(input_path, require)
 
         intermediate_path = self.path_temp('mp3')  # see note above
 
@@ -419,6 +433,72 @@ class Service(object):
 
         shutil.move(intermediate_path, output_path)  # see note above
 
+    def cli_transcode_segments(self, input_paths, output_path, require=None):
+        """
+        Runs the LAME transcoder to create a single MP3 file out of the
+        given WAV segments, in order.
+
+        The segments are first joined in-process (see util_concat_wav()),
+        so that LAME only needs to run once and there are no gaps between
+        segments. If they cannot be joined (e.g. their sample rates do
+        not match), each segment is transcoded on its own and the MP3s
+        are merged instead.
+        """
+
+        if len(input_paths) == 1:
+            self.cli_transcode(input_paths[0], output_path, require=require)
+            return
+
+        for input_path in input_paths:
+            self._cli_transcode_check(input_path, require)
+
+        wav_path = self.path_temp('wav')
+        mp3_paths = []
+
+        try:
+            try:
+                self.util_concat_wav(input_paths, wav_path)
+
+            except (EnvironmentError, EOFError, ValueError,
+                    wave.Error) as error:
+                self._logger.debug("Cannot join segments (%s); transcoding "
+                                   "each of them instead", error)
+
+                for input_path in input_paths:
+                    mp3_path = self.path_temp('mp3')
+                    mp3_paths.append(mp3_path)
+                    self.cli_transcode(input_path, mp3_path)
+                self.util_merge(mp3_paths, output_path)
+
+            else:
+                self.cli_transcode(wav_path, output_path)
+
+        finally:
+            self.path_unlink(wav_path, mp3_paths)
+
+    @staticmethod
+    def _cli_transcode_check(input_path, require):
+        """
+        Raises an exception if the input file to be transcoded does not
+        exist or, if require has 'size_in', is smaller than that.
+        """
+
+        if not os.path.exists(input_path):
+            raise RuntimeError(
+                "The input file to transcode to an MP3 could not be found. "
+                "Please report this problem if it persists."
+            )
+
+        if require and 'size_in' in require and \
+           os.path.getsize(input_path) < require['size_in']:
+            raise ValueError(
+                "Input to transcoder was %d-byte stream; wanted %d+ bytes "
+                "(the service might not have liked your input text)" % (
+                    os.path.getsize(input_path),
+                    require['size_in'],
+                )
+            )
+
     def _cli_exec(self, callee, args, purpose, redirect_stderr=False):
         """
         Handles the underlying system call, logging, and exceptions when
@@ -486,7 +566,7 @@ class Service(object):
         """Returns the headers for a URL."""
 
         self._logger.debug("GET %s for headers", url)
-        self._netops += 1
+        self.net_tally()
 
         from urllib2 import urlopen, Request
         return urlopen(
@@ -563,7 +643,7 @@ class Service(object):
             if custom_headers:
                 headers.update(custom_headers)
 
-            self._netops += 1
+            self.net_tally()
             response = urlopen(
                 Request(
                     url=('?'.join([url, params]) if params and method == 'GET'
@@ -619,12 +699,24 @@ class Service(object):
         """
         Downloads a file to the given path from the specified target(s).
         See net_stream() for information about available options.
+
+        If an MP3 is required (by its 'mime'), the file is checked with
+        mp3.validate(), and it is removed again (and InvalidMP3Error is
+        raised) if it is not usable, e.g. if it has been truncated.
         """
 
         payload = self.net_stream(*args, **kwargs)
         with open(path, 'wb') as response_output:
             response_output.write(payload)
 
+        require = kwargs.get('require') or {}
+        if require.get('mime') in ['audio/mpeg', 'audio/mp3']:
+            try:
+                mp3.validate(path)
+            except self.InvalidMP3Error:
+                self.path_unlink(path)
+                raise
+
     def net_dump(self, output_path, url):
         """
         Use `mplayer` to retrieve an audio stream and dump it to a raw
@@ -636,7 +728,7 @@ class Service(object):
         """
 
         if url.startswith('http'):
-            self._netops += 1
+            self.net_tally()
 
         try:
             self.cli_call(
@@ -660,21 +752,147 @@ class Service(object):
         if not os.path.exists(output_path):
             raise RuntimeError("Dumping the audio stream w/ mplayer failed.")
 
+    def net_resolved(self, key, resolve, use, lifetime=None):
+        """
+        Calls use() with the value (e.g. an audio URL) that resolve()
+        finds for the key (e.g. a voice and word) and returns its result.
+
+        The value is remembered in the store for lifetime seconds (or
+        RESOLVE_SECS), so that repeat lookups of the key can skip the
+        requests and parsing done by resolve(). If use() fails with a
+        remembered value, it is forgotten and resolved again.
+        """
+
+        from time import time
+
+        kind = 'resolved-' + type(self).__name__.lower()
+        lifetime = lifetime or self.RESOLVE_SECS
+
+        value = self._store.get(kind, key, time() - lifetime)
+        if value:
+            self._logger.debug("Using remembered %s for %s", value, key)
+            try:
+                return use(value)
+            except (IOError, ValueError) as error:
+                self._logger.debug("Remembered %s for %s failed (%s); "
+                                   "resolving again", value, key, error)
+                self._store.delete(kind, [key])
+
+        value = resolve()
+        result = use(value)
+        self._store.expire(kind, time() - lifetime)
+        self._store.put(kind, key, value)
+        return result
+
+    def net_pipeline(self, subtexts, subpaths, resolve, fetch,
+                     key=None, lifetime=None):
+        """
+        Runs a two-phase service (e.g. one that posts a form to get an
+        MP3 URL, then downloads that) for each subtext, calling fetch()
+        with the value that resolve() finds for the subtext, the subtext
+        itself, and the corresponding subpath to write.
+
+        Up to PIPELINE_THREADS subtexts are resolved at the same time in
+        threads of their own, while the calling thread fetches each
+        segment, in order, as soon as its value is ready. This way, a
+        download overlaps with the resolution of later segments.
+
+        If lifetime is given, values are remembered in the store for
+        that many seconds under key(subtext), so that a repeat request
+        for the same subtext skips resolve(). If fetch() fails with a
+        remembered value, the subtext is resolved again.
+        """
+
+        from Queue import Queue
+        from threading import Thread
+        from time import time
+
+        kind = 'resolved-' + type(self).__name__.lower()
+        since = time() - lifetime if lifetime else None
+        results = [Queue(1) for _ in subtexts]
+        pending = list(reversed(list(enumerate(subtexts))))
+        state = dict(stopped=False)
+
+        def resolver():
+            """Resolves subtexts until there are none left."""
+
+            while not state['stopped']:
+                try:
+                    index, subtext = pending.pop()  # atomic, thanks to GIL
+                except IndexError:
+                    return
+
+                self.net_reset()  # this thread's count, see net_count()
+                try:
+                    value = lifetime and self._store.get(kind, key(subtext),
+                                                         since)
+                    if value:
+                        results[index].put((True, value, True, 0))
+                    else:
+                        value = resolve(subtext)
+                        results[index].put((True, value, False,
+                                            self.net_count()))
+                except Exception as exception:  # all, pylint:disable=W0703
+                    results[index].put((False, exception, False,
+                                        self.net_count()))
+
+        for _ in range(min(self.PIPELINE_THREADS, len(subtexts))):
+            thread = Thread(target=resolver)
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for subtext, subpath, result in zip(subtexts, subpaths, results):
+                okay, value, remembered, count = result.get()
+                self.net_tally(count)  # resolved in another thread
+                if not okay:
+                    raise value
+
+                try:
+                    fetch(value, subtext, subpath)
+                except (IOError, ValueError) as error:
+                    if not remembered:
+                        raise
+                    self._logger.debug("Remembered %s for %s failed (%s); "
+                                       "resolving again", value, subtext,
+                                       error)
+                    self._store.delete(kind, [key(subtext)])
+                    value, remembered = resolve(subtext), False
+                    fetch(value, subtext, subpath)
+
+                if lifetime and not remembered:
+                    self._store.put(kind, key(subtext), value)
+
+        finally:
+            state['stopped'] = True
+
+        if lifetime:
+            self._store.expire(kind, since)
+
     def net_count(self):
         """
-        Returns the number of downloads the last run required. Intended
-        for use by the router to query after a run.
+        Returns the number of downloads the last run in the current
+        thread required. Intended for use by the router to query after a
+        run, from the thread that did the run.
+
+        The count is kept per thread, so that runs of the same service
+        going on at the same time in other threads do not add to it.
         """
 
-        return self._netops
+        return getattr(self._netops, 'count', 0)
 
     def net_reset(self):
         """
-        Resets the download count back to zero. Intended for use by the
-        router before a run.
+        Resets the download count of the current thread back to zero.
+        Intended for use by the router before a run.
         """
 
-        self._netops = 0
+        self._netops.count = 0
+
+    def net_tally(self, count=1):
+        """Adds to the download count of the current thread."""
+
+        self._netops.count = self.net_count() + count
 
     def path_temp(self, extension):
         """
@@ -772,17 +990,69 @@ class Service(object):
                if isinstance(text, unicode) \
                else text
 
+    def util_concat_wav(self, input_files, output_file):
+        """
+        Joins several WAV files into a single one, copying their audio
+        a few frames at a time. All of the inputs must have the same
+        number of channels, sample width, and sample rate, or else a
+        ValueError is raised.
+        """
+
+        self._logger.debug("Joining %s into %s", input_files, output_file)
+        output_stream = None
+        output_params = None
+
+        try:
+            for input_file in input_files:
+                input_stream = wave.open(input_file, 'rb')
+
+                try:
+                    params = input_stream.getparams()[:3]
+                    if output_stream is None:
+                        output_stream = wave.open(output_file, 'wb')
+                        output_stream.setparams(params +
+                                                (0, 'NONE', 'not compressed'))
+                        output_params = params
+                    elif params != output_params:
+                        raise ValueError(
+                            "%s has %d channel(s) of %d-byte samples at %d "
+                            "Hz, unlike the segments before it" %
+                            ((input_file,) + params)
+                        )
+
+                    while True:
+                        frames = input_stream.readframes(WAV_FRAMES)
+                        if not frames:
+                            break
+                        output_stream.writeframesraw(frames)
+
+                finally:
+                    input_stream.close()
+
+        finally:
+            if output_stream is not None:
+                output_stream.close()
+
     def util_merge(self, input_files, output_file):
         """
-        Given several input files, dumbly merge together into a single
-        output file.
+        Given several input MP3 files, merge their frames together into
+        a single output file with one header (see mp3.merge()). If any
+        of them does not look like an MP3, they are dumbly merged.
         """
 
         self._logger.debug("Merging %s into %s", input_files, output_file)
+        try:
+            mp3.merge(input_files, output_file)
+            return
+        except ValueError as error:
+            self._logger.warn("Cannot merge by frames (%s); merging whole "
+                              "files instead", error)
+
         with open(output_file, 'wb') as output_stream:
             for input_file in input_files:
                 with open(input_file, 'rb') as input_stream:
-                    output_stream.write(input_stream.read())
+                    shutil.copyfileobj(input_stream, output_stream,
+                                       mp3.BUFFER_SIZE)
 
     def util_pad(self, path):
         """
@@ -800,6 +1070,35 @@ class Service(object):
         that have character limits. Returns a list of strings.
         """
 
+        bits = self._split(text, limit)
+
+        if len(bits) > 1:
+            self._logger.debug(
+                "Input phrase split using %d-character limit:\n%s",
+                limit,
+                "\n".join(
+                    '    #%d: "%s"' % (number, bit)
+                    for number, bit in enumerate(bits, 1)
+                ),
+            )
+
+        return bits
+
+    def util_segments(self, text):
+        """
+        Returns the number of pieces that run() would break the text
+        into, based on the SPLIT_LIMIT advertised by the service, but
+        without logging anything, e.g. for estimating a batch's cost.
+        """
+
+        return len(self._split(text, self.SPLIT_LIMIT)) if self.SPLIT_LIMIT \
+            else 1
+
+    def _split(self, text, limit):
+        """
+        Does the actual work for util_split() and util_segments().
+        """
+
         bits = []
 
         while len(text) > limit:
@@ -826,17 +1125,6 @@ class Service(object):
             text = text.lstrip(self.SPLIT_CHARACTERS)
 
         bits.append(text)
-
-        if len(bits) > 1:
-            self._logger.debug(
-                "Input phrase split using %d-character limit:\n%s",
-                limit,
-                "\n".join(
-                    '    #%d: "%s"' % (number, bit)
-                    for number, bit in enumerate(bits, 1)
-                ),
-            )
-
         return bits
 
     @classmethod
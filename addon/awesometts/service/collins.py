@@ -115,14 +115,25 @@ class Collins(Service):
         return text
 
     def run(self, text, options, path):
-        """Find audio filename and then download it."""
+        """
+        Find audio filename (see _find_mp3(), which is skipped if the
+        word was looked up recently) and then download it.
+        """
 
         if text.count(' ') > TEXT_SPACE_LIMIT:
             raise IOError("The Collins Dictionary does not support phrases")
         elif len(text) > TEXT_LENGTH_LIMIT:
             raise IOError("The Collins Dictionary only supports short input")
 
-        voice = options['voice']
+        self.net_resolved(
+            key='/'.join([options['voice'], text]),
+            resolve=lambda: self._find_mp3(text, options['voice']),
+            use=lambda mp3_url: self.net_download(path, mp3_url,
+                                                  require=REQUIRE_MP3),
+        )
+
+    def _find_mp3(self, text, voice):
+        """Search the dictionary and return the URL of the audio."""
 
         payload = self.net_stream(
             (SEARCH_FORM, dict(q=text, dictCode=LANG_TO_DICTCODE[voice])),
@@ -134,11 +145,7 @@ class Collins(Service):
 
             match = regexp.search(payload)
             if match:
-                self.net_download(path,
-                                  COLLINS_WEBSITE + match.group(1),
-                                  require=REQUIRE_MP3)
-                break
-
-        else:
-            raise IOError("Cannot find any recorded audio in Collins "
-                          "dictionary for this input.")
+                return COLLINS_WEBSITE + match.group(1)
+
+        raise self.NotFoundError("Cannot find any recorded audio in Collins "
+                                 "dictionary for this input.")
@@ -138,9 +138,8 @@ class Duden(Service):
 
     def run(self, text, options, path):
         """
-        Search the dictionary, walk the returned articles, then download
-        articles that look like a match, and find MP3s in those articles
-        that match the original input.
+        Find the MP3 for the input (see _find_mp3(), which is skipped if
+        the word was looked up recently) and download it.
         """
 
         assert options['voice'] == 'de', "Only German is supported."
@@ -154,6 +153,23 @@ class Duden(Service):
             raise IOError("Your input text uses characters that cannot be "
                           "accurately searched for in the Duden.")
 
+        self.net_resolved(
+            key=text,
+            resolve=lambda: self._find_mp3(text),
+            use=lambda mp3_url: self.net_download(
+                path,
+                mp3_url,
+                require=dict(mime='audio/mpeg'),
+            ),
+        )
+
+    def _find_mp3(self, text):
+        """
+        Search the dictionary, walk the returned articles, then download
+        articles that look like a match, and find the URL of an MP3 in
+        those articles that matches the original input.
+        """
+
         text_search = text.replace('sz', u'\u00df')
         self._logger.debug('Duden: Searching on "%s"', text_search)
         try:
@@ -161,7 +177,8 @@ class Duden(Service):
                                           require=dict(mime='text/html'))
         except IOError as io_error:
             if getattr(io_error, 'code', None) == 404:
-                raise IOError("Duden does not recognize this input.")
+                raise self.NotFoundError("Duden does not recognize this "
+                                         "input.")
             else:
                 raise
 
@@ -233,9 +250,7 @@ class Duden(Service):
                                        'matches our input',
                                        mp3_url, guide, guide_normalized)
 
-                    self.net_download(path, mp3_url,
-                                      require=dict(mime='audio/mpeg'))
-                    return
+                    return mp3_url
 
                 else:
                     self._logger.debug('Duden: found non-matching MP3 at %s '
@@ -243,4 +258,5 @@ class Duden(Service):
                                        'and does not match our input',
                                        mp3_url, guide, guide_normalized)
 
-        raise IOError("Duden does not have recorded audio for this word.")
+        raise self.NotFoundError("Duden does not have recorded audio for "
+                                 "this word.")
@@ -88,6 +88,8 @@ class FluencyNl(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 250
+
     def desc(self):
         """Returns service name with a voice count."""
 
@@ -158,7 +160,7 @@ class FluencyNl(Service):
                         rtf=50,
                     ),
                 )
-                for subtext in self.util_split(text, 250)
+                for subtext in self.util_split(text, self.SPLIT_LIMIT)
             ],
             method='POST',
             custom_headers=dict(Referer='http://www.fluency.nl/speak.swf'),
@@ -47,6 +47,8 @@ class Google(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 100
+
     _VOICE_CODES = {
         # n.b. When modifying any variants, make sure that there are
         # aliases defined in the voice_lookup list below for the most
@@ -178,10 +180,10 @@ class Google(Service):
                                          in headers['Set-Cookie'].split(','))
                 self._logger.debug("Google cookies are %s", self._cookies)
 
-        subtexts = self.util_split(text, 100)
+        subtexts = self.util_split(text, self.SPLIT_LIMIT)
 
         try:
-            self._netops += 10 * len(subtexts)
+            self.net_tally(10 * len(subtexts))
             self.net_download(
                 path,
                 [
@@ -104,11 +104,18 @@ class Howjsay(Service):
         except (ValueError, IOError) as error:
             if getattr(error, 'code', None) == 404 or \
                     getattr(error, 'got_mime', None) == 'text/html':
-                raise IOError(
+                message = (
                     "Howjsay does not have recorded audio for this phrase. "
                     "While most words have recordings, most phrases do not."
                     if text.count(' ')
                     else "Howjsay does not have recorded audio for this word."
                 )
+
+                # only a real 404 is remembered as a missing word, as an
+                # HTML page might just be an outage or a captive portal
+                if getattr(error, 'code', None) == 404:
+                    raise self.NotFoundError(message)
+                raise IOError(message)
+
             else:
                 raise
@@ -42,6 +42,8 @@ class ImTranslator(Service):
 
     TRAITS = [Trait.INTERNET, Trait.TRANSCODING]
 
+    SPLIT_LIMIT = 400
+
     _VOICES = [('Stefan', 'de', 'male'), ('VW Paul', 'en', 'male'),
                ('VW Kate', 'en', 'female'), ('Jorge', 'es', 'male'),
                ('Florence', 'fr', 'female'), ('Matteo', 'it', 'male'),
@@ -51,6 +53,8 @@ class ImTranslator(Service):
 
     _RE_SWF = re.compile(r'https?:[\w:/\.]+\.swf\?\w+=\w+', re.IGNORECASE)
 
+    _SWF_SECS = 600  # how long a SWF path from the page is remembered
+
     def __init__(self, *args, **kwargs):
         if self.IS_MACOSX:
             raise EnvironmentError(
@@ -147,75 +151,77 @@ class ImTranslator(Service):
         """
 
         output_wavs = []
-        output_mp3s = []
         require = dict(size_in=4096)
 
         logger = self._logger
 
-        try:
-            for subtext in self.util_split(text, 400):
-                for i in range(1, 4):
-                    try:
-                        logger.info("ImTranslator net_stream: attempt %d", i)
-                        result = self.net_stream(
-                            ('http://imtranslator.net/translate-and-speak/'
-                             'sockets/tts.asp',
-                             dict(text=subtext, vc=options['voice'],
-                                  speed=options['speed'], FA=1)),
-                            require=dict(mime='text/html', size=256),
-                            method='POST',
-                        )
-
-                        result = self._RE_SWF.search(result)
-                        if not result or not result.group():
-                            raise EnvironmentError('500b', "cannot find SWF"
-                                                           "path in payload")
-                        result = result.group()
-                    except (EnvironmentError, IOError) as error:
-                        if getattr(error, 'code', None) == 500:
-                            logger.warn("ImTranslator net_stream: got 500")
-                        elif getattr(error, 'errno', None) == '500b':
-                            logger.warn("ImTranslator net_stream: no SWF path")
-                        elif 'timed out' in format(error):
-                            logger.warn("ImTranslator net_stream: timeout")
-                        else:
-                            logger.error("ImTranslator net_stream: %s", error)
-                            raise
+        def resolve(subtext):
+            """Downloads the page for the subtext and finds its SWF."""
+
+            for i in range(1, 4):
+                try:
+                    logger.info("ImTranslator net_stream: attempt %d", i)
+                    result = self.net_stream(
+                        ('http://imtranslator.net/translate-and-speak/'
+                         'sockets/tts.asp',
+                         dict(text=subtext, vc=options['voice'],
+                              speed=options['speed'], FA=1)),
+                        require=dict(mime='text/html', size=256),
+                        method='POST',
+                    )
+
+                    result = self._RE_SWF.search(result)
+                    if not result or not result.group():
+                        raise EnvironmentError('500b', "cannot find SWF"
+                                                       "path in payload")
+                    result = result.group()
+                except (EnvironmentError, IOError) as error:
+                    if getattr(error, 'code', None) == 500:
+                        logger.warn("ImTranslator net_stream: got 500")
+                    elif getattr(error, 'errno', None) == '500b':
+                        logger.warn("ImTranslator net_stream: no SWF path")
+                    elif 'timed out' in format(error):
+                        logger.warn("ImTranslator net_stream: timeout")
                     else:
-                        logger.info("ImTranslator net_stream: success")
-                        break
+                        logger.error("ImTranslator net_stream: %s", error)
+                        raise
                 else:
-                    logger.error("ImTranslator net_stream: exhausted")
-                    raise SocketError("unable to fetch page from ImTranslator "
-                                      "even after multiple attempts")
-
-                output_wav = self.path_temp('wav')
-                output_wavs.append(output_wav)
-
-                for i in range(1, 4):
-                    try:
-                        logger.info("ImTranslator net_dump:   attempt %d", i)
-                        self.net_dump(output_wav, result)
-                    except RuntimeError:
-                        logger.warn("ImTranslator net_dump:   failure")
-                    else:
-                        logger.info("ImTranslator net_dump:   success")
-                        break
+                    logger.info("ImTranslator net_stream: success")
+                    return result
+
+            logger.error("ImTranslator net_stream: exhausted")
+            raise SocketError("unable to fetch page from ImTranslator "
+                              "even after multiple attempts")
+
+        def fetch(result, subtext, output_wav):  # pylint:disable=W0613
+            """Dumps the audio from the SWF to the given WAV path."""
+
+            for i in range(1, 4):
+                try:
+                    logger.info("ImTranslator net_dump:   attempt %d", i)
+                    self.net_dump(output_wav, result)
+                except RuntimeError:
+                    logger.warn("ImTranslator net_dump:   failure")
                 else:
-                    logger.error("ImTranslator net_dump:   exhausted")
-                    raise SocketError("unable to dump audio from ImTranslator "
-                                      "even after multiple attempts")
+                    logger.info("ImTranslator net_dump:   success")
+                    return
 
-            if len(output_wavs) > 1:
-                for output_wav in output_wavs:
-                    output_mp3 = self.path_temp('mp3')
-                    output_mp3s.append(output_mp3)
-                    self.cli_transcode(output_wav, output_mp3, require=require)
+            logger.error("ImTranslator net_dump:   exhausted")
+            raise SocketError("unable to dump audio from ImTranslator "
+                              "even after multiple attempts")
 
-                self.util_merge(output_mp3s, path)
+        try:
+            subtexts = self.util_split(text, self.SPLIT_LIMIT)
+            output_wavs.extend(self.path_temp('wav') for _ in subtexts)
+            self.net_pipeline(
+                subtexts, output_wavs, resolve, fetch,
+                key=lambda subtext: '/'.join([options['voice'],
+                                              str(options['speed']),
+                                              subtext]),
+                lifetime=self._SWF_SECS,
+            )
 
-            else:
-                self.cli_transcode(output_wavs[0], path, require=require)
+            self.cli_transcode_segments(output_wavs, path, require=require)
 
         finally:
-            self.path_unlink(output_wavs, output_mp3s)
+            self.path_unlink(output_wavs)
@@ -88,6 +88,8 @@ class ISpeech(Service):
     # to rate-limit it or trigger error caching behavior
     TRAITS = []
 
+    SPLIT_LIMIT = 250
+
     def desc(self):
         """Returns name with a voice count."""
 
@@ -145,7 +147,7 @@ class ISpeech(Service):
                      dict(apikey=options['key'], action='convert',
                           text=subtext, voice=options['voice'],
                           speed=options['speed'], pitch=options['pitch']))
-                    for subtext in self.util_split(text, 250)
+                    for subtext in self.util_split(text, self.SPLIT_LIMIT)
                 ],
                 require=dict(mime='audio/mpeg', size=256),
                 add_padding=True,
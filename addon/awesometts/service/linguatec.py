@@ -76,6 +76,8 @@ VOICES = [('Alice-ml', "Alice", 'it'), ('Allison', "Allison", 'en-US'),
 
 FORM_ENDPOINT = 'http://www.linguatec.net/onlineservices/vrs15_getmp3'
 
+URL_SECS = 600  # how long an MP3 URL from the form is remembered
+
 RE_MP3 = re_compile(r'https?://[-\w.]+\.linguatec\.org/[-\w/]+\.mp3')
 
 REQUIRE_MP3 = dict(mime='audio/mpeg', size=256)
@@ -93,6 +95,8 @@ class Linguatec(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 250  # see `maxlength` on site
+
     def desc(self):
         """Returns name with a voice count."""
 
@@ -124,8 +128,8 @@ class Linguatec(Service):
 
         voice = options['voice']
 
-        def fetch_piece(subtext, subpath):
-            """Fetch given phrase from demo to given path."""
+        def resolve(subtext):
+            """Gets the MP3 URL for the given phrase from the demo."""
 
             payload = self.net_stream(
                 (
@@ -142,19 +146,23 @@ class Linguatec(Service):
             match = RE_MP3.search(payload)
             if not match:
                 raise SocketError("No MP3 was returned for the input.")
-            url = match.group(0)
+            return match.group(0)
+
+        def fetch(url, subtext, subpath):  # pylint:disable=unused-argument
+            """Downloads the MP3 URL to the given subpath."""
+
             self.net_download(subpath, url, require=REQUIRE_MP3)
 
-        subtexts = self.util_split(text, 250)  # see `maxlength` on site
+        pipeline = dict(resolve=resolve, fetch=fetch, lifetime=URL_SECS,
+                        key=lambda subtext: voice + '/' + subtext)
+
+        subtexts = self.util_split(text, self.SPLIT_LIMIT)
         if len(subtexts) == 1:
-            fetch_piece(text, path)
+            self.net_pipeline(subtexts, [path], **pipeline)
         else:
-            intermediate_mp3s = []
+            intermediate_mp3s = [self.path_temp('mp3') for _ in subtexts]
             try:
-                for subtext in subtexts:
-                    intermediate_mp3 = self.path_temp('mp3')
-                    intermediate_mp3s.append(intermediate_mp3)
-                    fetch_piece(subtext, intermediate_mp3)
+                self.net_pipeline(subtexts, intermediate_mp3s, **pipeline)
                 self.util_merge(intermediate_mp3s, path)
             finally:
                 self.path_unlink(intermediate_mp3s)
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+
+# AwesomeTTS text-to-speech add-on for Anki
+#
+# Copyright (C) 2016       Anki AwesomeTTS Development Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Frame-level handling of MP3 files
+
+Provides a scan() function for finding where the audio frames of an MP3
+file are (past any ID3 tags and Xing/Info/VBRI header frame), a merge()
+function that joins several MP3 files using those scans, and a validate()
+function that rejects files that are not usable MP3s.
+"""
+
+import os
+from struct import pack, unpack
+
+__all__ = ['InvalidError', 'Stream', 'merge', 'scan', 'validate']
+
+
+BUFFER_SIZE = 2**16  # bytes copied at a time when merging
+
+MIN_DURATION = 0.1  # seconds of audio below which validate() rejects a file
+
+SYNC_SEARCH = 2**14  # bytes searched for the first frame after any ID3v2 tag
+
+# bitrates in kbps by (MPEG-1?, layer), indexed by the header's bitrate bits
+BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384,
+                416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320,
+                384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256,
+                320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192,
+                 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144,
+                 160],
+}
+BITRATES[False, 3] = BITRATES[False, 2]
+
+# sample rates in Hz by the header's version bits, indexed by its rate bits
+SAMPLE_RATES = {
+    0: [11025, 12000, 8000],  # MPEG-2.5
+    2: [22050, 24000, 16000],  # MPEG-2
+    3: [44100, 48000, 32000],  # MPEG-1
+}
+
+
+class InvalidError(ValueError):
+    """Raised by validate() for files that are not usable MP3s."""
+
+
+class Stream(object):
+    """
+    Describes where the audio frames of an MP3 file are, as found by
+    scan(), and what they hold.
+    """
+
+    __slots__ = [
+        'end',          # offset just past the last audio frame
+        'frames',       # number of audio frames
+        'header',       # first audio frame's header (as an integer)
+        'path',         # path of the file that was scanned
+        'sample_rate',  # sample rate of the first audio frame, in Hz
+        'samples',      # number of samples in all of the audio frames
+        'size',         # size of the file, less any ID3v1 tag at its end
+        'start',        # offset of the first audio frame
+        'truncated',    # True if the last frame runs past the end of file
+        'vbr',          # True if the frames are not all at the same bitrate
+    ]
+
+    def __init__(self, path):
+        self.end = self.start = 0
+        self.frames = self.samples = self.sample_rate = 0
+        self.header = None
+        self.path = path
+        self.size = 0
+        self.truncated = False
+        self.vbr = False
+
+    @property
+    def duration(self):
+        """Returns the length of the audio frames in seconds."""
+
+        return float(self.samples) / self.sample_rate if self.frames else 0.0
+
+
+def scan(path):
+    """
+    Returns a Stream for the MP3 file at the given path. Only frame
+    headers are read (and the first frame, to check for a Xing, Info,
+    or VBRI header), so this is fast even for long files.
+
+    A file that does not have any valid frames gets a Stream whose
+    frames count is zero.
+    """
+
+    stream = Stream(path)
+
+    with open(path, 'rb') as handle:
+        handle.seek(0, os.SEEK_END)
+        size = handle.tell()
+        if size >= 128:
+            handle.seek(size - 128)
+            if handle.read(3) == 'TAG':
+                size -= 128
+        stream.size = size
+
+        handle.seek(0)
+        offset = _id3v2_size(handle.read(10))
+        handle.seek(offset)
+        window = handle.read(SYNC_SEARCH)
+
+        def header_at(position):
+            """Returns the parsed frame header at position, if any."""
+            if position + 4 > size:
+                return None
+            handle.seek(position)
+            return _parse(handle.read(4))
+
+        for index in xrange(max(len(window) - 3, 0)):
+            if window[index] != '\xff':
+                continue
+            frame = _parse(window[index:index + 4])
+            if not frame:
+                continue
+            following = offset + index + frame['length']
+            if following == size or header_at(following):
+                position = offset + index
+                break
+        else:
+            stream.start = stream.end = offset
+            return stream
+
+        handle.seek(position)
+        if _is_info_frame(handle.read(frame['length']), frame):
+            position += frame['length']
+            frame = header_at(position)
+            if not frame:
+                stream.start = stream.end = position
+                return stream
+
+        stream.start = position
+        stream.header = frame['header']
+        stream.sample_rate = frame['sample_rate']
+        bitrate = frame['bitrate']
+
+        while frame:
+            if position + frame['length'] > size:
+                stream.truncated = True
+                break
+            stream.frames += 1
+            stream.samples += frame['samples']
+            if frame['bitrate'] != bitrate:
+                stream.vbr = True
+            position += frame['length']
+            frame = header_at(position)
+
+        stream.end = position
+
+    return stream
+
+
+def merge(input_paths, output_path):
+    """
+    Joins the audio frames of the given MP3 files into a new one, with
+    a single Info (or Xing, for variable bitrates) header frame that
+    describes the whole result, e.g. so that players can tell its
+    duration. The ID3 tags and header frames of the inputs are dropped.
+
+    Bytes trailing the last frame of the last input (e.g. padding that
+    a service added so that playback is not clipped) are kept.
+
+    Raises ValueError if any of the inputs has no audio frames.
+    """
+
+    streams = [scan(input_path) for input_path in input_paths]
+    for stream in streams:
+        if not stream.frames:
+            raise ValueError("%s does not have any MP3 frames" % stream.path)
+
+    with open(output_path, 'wb') as output:
+        info = _info_frame(streams)
+        if info:
+            output.write(info)
+
+        for stream in streams:
+            _copy(stream.path, stream.start, stream.end, output)
+
+        last = streams[-1]
+        _copy(last.path, last.end, last.size, output)
+
+
+def validate(path, min_duration=MIN_DURATION):
+    """
+    Returns the Stream for the file at the given path if it looks like
+    a usable MP3 (i.e. it has valid frames, its last frame is complete,
+    and it is at least min_duration seconds long), or raises an
+    InvalidError (e.g. for an HTML error page or truncated download).
+    """
+
+    stream = scan(path)
+
+    if not stream.frames:
+        raise InvalidError("The audio does not have any MP3 frames")
+    if stream.truncated:
+        raise InvalidError("The audio is cut off partway through an MP3 "
+                           "frame")
+    if stream.duration < min_duration:
+        raise InvalidError("The audio is only %.3f seconds long" %
+                           stream.duration)
+
+    return stream
+
+
+def _parse(data):
+    """
+    Returns a dict describing the frame header in the given four bytes,
+    or None if they are not a valid frame header.
+    """
+
+    if len(data) < 4:
+        return None
+
+    header, = unpack('>I', data)
+    if header & 0xffe00000 != 0xffe00000:
+        return None
+
+    version = header >> 19 & 3
+    layer = 4 - (header >> 17 & 3)
+    bitrate_index = header >> 12 & 15
+    rate_index = header >> 10 & 3
+    if version == 1 or layer == 4 or bitrate_index in [0, 15] or \
+            rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[mpeg1, layer][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = header >> 9 & 1
+
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+        samples = 384
+    elif layer == 2 or mpeg1:
+        length = 144 * bitrate // sample_rate + padding
+        samples = 1152
+    else:
+        length = 72 * bitrate // sample_rate + padding
+        samples = 576
+
+    return dict(bitrate=bitrate, header=header, layer=layer, length=length,
+                mono=header >> 6 & 3 == 3, mpeg1=mpeg1, samples=samples,
+                sample_rate=sample_rate)
+
+
+def _side_info(frame):
+    """Returns the offset past the Layer III side information."""
+
+    if frame['mpeg1']:
+        return 4 + (17 if frame['mono'] else 32)
+    return 4 + (9 if frame['mono'] else 17)
+
+
+def _is_info_frame(data, frame):
+    """Returns True if the frame carries a Xing, Info, or VBRI header."""
+
+    if frame['layer'] != 3:
+        return False
+
+    offset = _side_info(frame)
+    return data[offset:offset + 4] in ['Xing', 'Info'] or \
+        data[36:40] == 'VBRI'
+
+
+def _info_frame(streams):
+    """
+    Returns the bytes of an Info (or Xing) frame with the frame count
+    and byte count of the given streams, modeled on the first frame of
+    the first stream, or None if the streams are not all Layer III at
+    the same sample rate.
+    """
+
+    frame = _parse(pack('>I', streams[0].header))
+    if frame['layer'] != 3 or any(
+            stream.header >> 17 & 0x1f != frame['header'] >> 17 & 0x1f or
+            stream.sample_rate != frame['sample_rate']
+            for stream in streams
+    ):
+        return None
+
+    offset = _side_info(frame)
+    own_index = frame['header'] >> 12 & 15
+    vbr = any(stream.vbr or stream.header >> 12 & 15 != own_index
+              for stream in streams)
+
+    # no CRC and no padding; like LAME, a constant bitrate stream keeps
+    # its own bitrate for this frame, otherwise (or if the fields do not
+    # fit at that bitrate) the smallest bitrate that fits them is used
+    for bitrate_index in ([] if vbr else [own_index]) + range(1, 15):
+        header = frame['header'] & ~0x1f200 | 0x10000 | bitrate_index << 12
+        length = _parse(pack('>I', header))['length']
+        if length >= offset + 16:
+            break
+
+    total = length + sum(stream.end - stream.start for stream in streams)
+
+    data = pack('>I', header) + '\0' * (offset - 4) + \
+        ('Xing' if vbr else 'Info') + \
+        pack('>III', 3, sum(stream.frames for stream in streams), total)
+    return data + '\0' * (length - len(data))
+
+
+def _id3v2_size(data):
+    """Returns the size of the ID3v2 tag starting with data, if any."""
+
+    if len(data) < 10 or data[:3] != 'ID3':
+        return 0
+
+    size = 0
+    for byte in data[6:10]:
+        size = size << 7 | ord(byte) & 0x7f
+    return 10 + size + (10 if ord(data[5]) & 0x10 else 0)
+
+
+def _copy(path, start, end, output):
+    """Copies the bytes from start to end of path onto output."""
+
+    remaining = end - start
+    if remaining <= 0:
+        return
+
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        while remaining:
+            chunk = handle.read(min(BUFFER_SIZE, remaining))
+            if not chunk:
+                break
+            output.write(chunk)
+            remaining -= len(chunk)
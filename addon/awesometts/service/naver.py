@@ -38,6 +38,8 @@ CNDIC_CONFIG = [
 
 TRANSLATE_INIT = 'http://translate.naver.com/getVcode.dic'
 TRANSLATE_ENDPOINT = 'http://translate.naver.com/tts'
+VCODE_SECS = 300  # how long a vcode is remembered for its text
+
 TRANSLATE_CONFIG = [
     ('from', 'translate'),
     ('service', 'translate'),
@@ -97,6 +99,8 @@ class Naver(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 250
+
     def desc(self):
         """Returns a static description."""
 
@@ -135,21 +139,24 @@ class Naver(Service):
                             ]
                         )
                     )
-                    for subtext in self.util_split(text, 250)
+                    for subtext in self.util_split(text, self.SPLIT_LIMIT)
                 ],
                 require=dict(mime='audio/mpeg', size=256),
                 custom_quoter=dict(text=_quote_all),
             )
 
         else:
-            def process_subtext(output_mp3, subtext):
-                """Request a vcode and download the MP3."""
+            def resolve(subtext):
+                """Request a vcode for the subtext."""
 
                 vcode = self.net_stream(
                     (TRANSLATE_INIT, dict(text=subtext)),
                     method='POST',
                 )
-                vcode = ''.join(char for char in vcode if char.isdigit())
+                return ''.join(char for char in vcode if char.isdigit())
+
+            def fetch(vcode, subtext, output_mp3):
+                """Download the MP3 with the subtext's vcode."""
 
                 self.net_download(
                     output_mp3,
@@ -168,20 +175,20 @@ class Naver(Service):
                     custom_quoter=dict(text=_quote_all),
                 )
 
-            subtexts = self.util_split(text, 250)
+            pipeline = dict(resolve=resolve, fetch=fetch, lifetime=VCODE_SECS,
+                            key=lambda subtext: options['voice'] + '/' +
+                            subtext)
+
+            subtexts = self.util_split(text, self.SPLIT_LIMIT)
 
             if len(subtexts) == 1:
-                process_subtext(path, subtexts[0])
+                self.net_pipeline(subtexts, [path], **pipeline)
 
             else:
-                try:
-                    output_mp3s = []
-
-                    for subtext in subtexts:
-                        output_mp3 = self.path_temp('mp3')
-                        output_mp3s.append(output_mp3)
-                        process_subtext(output_mp3, subtext)
+                output_mp3s = [self.path_temp('mp3') for _ in subtexts]
 
+                try:
+                    self.net_pipeline(subtexts, output_mp3s, **pipeline)
                     self.util_merge(output_mp3s, path)
 
                 finally:
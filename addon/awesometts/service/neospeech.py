@@ -55,6 +55,8 @@ BASE_URL = 'http://neospeech.com'
 
 DEMO_URL = BASE_URL + '/service/demo'
 
+URL_SECS = 600  # how long an audio URL from the demo is remembered
+
 REQUIRE_MP3 = dict(mime='audio/mpeg', size=256)
 
 
@@ -72,6 +74,8 @@ class NeoSpeech(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 200  # see `maxlength` on site
+
     def __init__(self, *args, **kwargs):
         self._lock = Lock()
         self._cookies = None
@@ -114,8 +118,8 @@ class NeoSpeech(Service):
 
             voice_id = MAP[options['voice']]
 
-            def fetch_piece(subtext, subpath):
-                """Fetch given phrase from the API to the given path."""
+            def resolve(subtext):
+                """Gets the audio URL for the given phrase from the API."""
 
                 payload = self.net_stream((DEMO_URL, dict(content=subtext,
                                                           voiceId=voice_id)),
@@ -135,20 +139,24 @@ class NeoSpeech(Service):
                 assert isinstance(url, basestring) and len(url) > 2 and \
                     url[0] == '/' and url[1].isalnum(), \
                     "The audio URL from NeoSpeech does not seem to be valid"
+                return url
+
+            def fetch(url, subtext, subpath):  # pylint:disable=unused-argument
+                """Downloads the audio URL to the given subpath."""
 
                 self.net_download(subpath, BASE_URL + url, require=REQUIRE_MP3,
                                   custom_headers=headers)
 
-            subtexts = self.util_split(text, 200)  # see `maxlength` on site
+            pipeline = dict(resolve=resolve, fetch=fetch, lifetime=URL_SECS,
+                            key=lambda subtext: '%d/%s' % (voice_id, subtext))
+
+            subtexts = self.util_split(text, self.SPLIT_LIMIT)
             if len(subtexts) == 1:
-                fetch_piece(subtexts[0], path)
+                self.net_pipeline(subtexts, [path], **pipeline)
             else:
-                intermediate_mp3s = []
+                intermediate_mp3s = [self.path_temp('mp3') for _ in subtexts]
                 try:
-                    for subtext in subtexts:
-                        intermediate_mp3 = self.path_temp('mp3')
-                        intermediate_mp3s.append(intermediate_mp3)
-                        fetch_piece(subtext, intermediate_mp3)
+                    self.net_pipeline(subtexts, intermediate_mp3s, **pipeline)
                     self.util_merge(intermediate_mp3s, path)
                 finally:
                     self.path_unlink(intermediate_mp3s)
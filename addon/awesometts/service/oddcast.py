@@ -223,6 +223,8 @@ class Oddcast(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 180  # see `maxlength` on site
+
     def desc(self):
         """Returns name with a voice count."""
 
@@ -284,7 +286,7 @@ class Oddcast(Service):
                 ('http://cache-a.oddcast.com/c_fs/%s.mp3' % get_md5(subtext),
                  dict(engine=eng_id, language=lang_id, voice=vo_id,
                       text=subtext, useUTF8=1))
-                for subtext in self.util_split(text, 180)  # see site maxlength
+                for subtext in self.util_split(text, self.SPLIT_LIMIT)
             ],
             require=dict(mime='audio/mpeg', size=256),
             add_padding=True,
@@ -118,16 +118,31 @@ class Oxford(Service):
 
     def run(self, text, options, path):
         """
-        Download wep page for given word
-        Then extract mp3 path and download it
+        Find the MP3 for the given word (see _find_mp3(), which is
+        skipped if the word was looked up recently) and download it.
         """
 
         if len(text) > 100:
             raise IOError("Input text is too long for the Oxford Dictionary")
 
+        self.net_resolved(
+            key='/'.join([options['voice'], text]),
+            resolve=lambda: self._find_mp3(text, options['voice']),
+            use=lambda sound_url: self.net_download(
+                path,
+                sound_url,
+                require=dict(mime='audio/mpeg', size=1024),
+            ),
+        )
+
+    def _find_mp3(self, text, voice):
+        """
+        Download web page for given word, then extract the MP3's URL.
+        """
+
         from urllib2 import quote
         dict_url = 'http://www.oxforddictionaries.com/definition/%s/%s' % (
-            'american_english' if options['voice'] == 'en-US' else 'english',
+            'american_english' if voice == 'en-US' else 'english',
             quote(text.encode('utf-8'))
         )
 
@@ -135,7 +150,7 @@ class Oxford(Service):
             html_payload = self.net_stream(dict_url)
         except IOError as io_error:
             if getattr(io_error, 'code', None) == 404:
-                raise IOError(
+                raise self.NotFoundError(
                     "The Oxford Dictionary does not recognize this phrase. "
                     "While most single words are recognized, many multi-word "
                     "phrases are not."
@@ -150,13 +165,8 @@ class Oxford(Service):
         parser.close()
 
         if len(parser.sounds) > 0:
-            sound_url = parser.sounds[0]
-
-            self.net_download(
-                path,
-                sound_url,
-                require=dict(mime='audio/mpeg', size=1024),
-            )
+            return parser.sounds[0]
         else:
-            raise IOError("The Oxford Dictionary recognized your input, "
-                          "but has no recorded audio for it.")
+            raise self.NotFoundError("The Oxford Dictionary recognized "
+                                     "your input, but has no recorded "
+                                     "audio for it.")
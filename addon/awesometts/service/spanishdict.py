@@ -39,6 +39,8 @@ class SpanishDict(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 200
+
     def desc(self):
         """
         Returns a short, static description.
@@ -86,7 +88,7 @@ class SpanishDict(Service):
                     text=subtext,
                 ))
 
-                for subtext in self.util_split(text, 200)
+                for subtext in self.util_split(text, self.SPLIT_LIMIT)
             ],
             add_padding=True,
             require=dict(mime='audio/mpeg', size=1024),
@@ -56,6 +56,8 @@ class VoiceText(Service):
 
     TRAITS = [Trait.INTERNET, Trait.TRANSCODING]
 
+    SPLIT_LIMIT = 100
+
     def desc(self):
         """Returns a short, static description."""
 
@@ -133,8 +135,8 @@ class VoiceText(Service):
         to MP3 using lame.
 
         If the input text is longer than 100 characters, it will be
-        split across multiple requests, transcoded, then merged back
-        together into a single MP3.
+        split across multiple requests, whose audio is then joined and
+        transcoded into a single MP3.
         """
 
         if len(text) > 250:
@@ -143,7 +145,6 @@ class VoiceText(Service):
         svc_paths = []
         caf_paths = []
         wav_paths = []
-        mp3_paths = []
 
         parameters = dict(
             speaker=options['voice'],
@@ -167,7 +168,7 @@ class VoiceText(Service):
         try:
             api_endpoint = self.ecosystem.web + '/api/voicetext'
 
-            for subtext in self.util_split(text, 100):
+            for subtext in self.util_split(text, self.SPLIT_LIMIT):
                 wav_path = self.path_temp('wav')
                 wav_paths.append(wav_path)
                 parameters['text'] = subtext
@@ -201,15 +202,7 @@ class VoiceText(Service):
                     else:  # mplayer works just fine on Linux and Windows
                         self.net_dump(wav_path, svc_path)
 
-            if len(wav_paths) > 1:
-                for wav_path in wav_paths:
-                    mp3_path = self.path_temp('mp3')
-                    mp3_paths.append(mp3_path)
-                    self.cli_transcode(wav_path, mp3_path)
-                self.util_merge(mp3_paths, path)
-
-            else:
-                self.cli_transcode(wav_paths[0], path)
+            self.cli_transcode_segments(wav_paths, path)
 
         finally:
-            self.path_unlink(svc_paths, caf_paths, wav_paths, mp3_paths)
+            self.path_unlink(svc_paths, caf_paths, wav_paths)
@@ -40,6 +40,8 @@ class Yandex(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 750
+
     _VOICE_CODES = {
         # n.b. The aliases code below assumes that no languages have any
         # variants and is therefore safe to always alias to the full
@@ -132,8 +134,9 @@ class Yandex(Service):
         """
         Downloads from Yandex directly to an MP3.
 
-        Yandex will occasionally fail by returning a tiny MP3 file. If this
-        happens, we retry the download (for a total of five tries).
+        Yandex will occasionally fail by returning a tiny or otherwise
+        invalid MP3 file. If this happens, we retry the download (for a
+        total of five tries).
         """
 
         def download():
@@ -150,7 +153,7 @@ class Yandex(Service):
 
                     # n.b. limit seems to be much higher than 750, but this is
                     # a safe place to start (the web UI limits the user to 100)
-                    for subtext in self.util_split(text, 750)
+                    for subtext in self.util_split(text, self.SPLIT_LIMIT)
                 ],
                 require=dict(mime='audio/mpeg', size=1024),
                 add_padding=True,
@@ -164,7 +167,7 @@ class Yandex(Service):
         for _ in range(5):
             try:
                 download()
-            except self.TinyDownloadError:
+            except (self.TinyDownloadError, self.InvalidMP3Error):
                 pass
             else:
                 break
@@ -44,6 +44,8 @@ class Youdao(Service):
 
     TRAITS = [Trait.INTERNET]
 
+    SPLIT_LIMIT = 1000
+
     def desc(self):
         """Returns a static description."""
 
@@ -91,7 +93,7 @@ class Youdao(Service):
                     audio=subtext,
                     type=VOICE_LOOKUP[options['voice']][1],
                 ))
-                for subtext in self.util_split(text, 1000)
+                for subtext in self.util_split(text, self.SPLIT_LIMIT)
             ],
             require=dict(mime='audio/mpeg', size=256),
             add_padding=True,
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# AwesomeTTS text-to-speech add-on for Anki
+#
+# Copyright (C) 2016       Anki AwesomeTTS Development Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Persistent storage of timestamped records that should survive restarts
+"""
+
+import sqlite3
+from threading import Lock
+from time import time
+
+__all__ = ['Store']
+
+
+class Store(object):
+    """
+    Exposes a class whose instances keep small timestamped records,
+    grouped by kind and looked up by key, in a given SQLite3 database
+    table, e.g. for remembering failures between sessions.
+
+    Records are indexed by their kind and timestamp, so expiring old
+    ones does not have to look at every record. Instances may be used
+    from service threads; each operation opens its own connection.
+    """
+
+    __slots__ = [
+        '_db',      # bundle with path, table
+        '_lock',    # threading.Lock serializing writes across threads
+        '_logger',  # logger-like interface with debug(), info(), etc.
+        '_ready',   # True once the table is known to exist
+    ]
+
+    def __init__(self, db, logger):
+        self._db = db
+        self._lock = Lock()
+        self._logger = logger
+        self._ready = False
+
+    def load(self, kind, since=None):
+        """
+        Returns a list of (key, value, when) tuples for the records of
+        the given kind, oldest first, optionally only those stored at
+        or after the since timestamp.
+        """
+
+        return self._execute(
+            'SELECT key, value, time FROM %s WHERE kind=? AND time>=? '
+            'ORDER BY time' % self._db.table,
+            (kind, since or 0),
+            fetch=True,
+        )
+
+    def get(self, kind, key, since=None):
+        """
+        Returns the value of the record of the given kind and key, or
+        None if there is no such record (or it is older than since).
+        """
+
+        rows = self._execute(
+            'SELECT value FROM %s WHERE kind=? AND key=? AND time>=?' %
+            self._db.table,
+            (kind, key, since or 0),
+            fetch=True,
+        )
+        return rows[0][0] if rows else None
+
+    def put(self, kind, key, value, when=None):
+        """Stores a record, replacing any with the same kind and key."""
+
+        self._execute(
+            'INSERT OR REPLACE INTO %s (kind, key, value, time) '
+            'VALUES (?, ?, ?, ?)' % self._db.table,
+            (kind, key, value, when or time()),
+        )
+
+    def delete(self, kind, keys=None):
+        """Deletes the records of the given kind with the given keys."""
+
+        if keys is None:
+            self._execute('DELETE FROM %s WHERE kind=?' % self._db.table,
+                          (kind,))
+        elif keys:
+            self._execute(
+                'DELETE FROM %s WHERE kind=? AND key=?' % self._db.table,
+                [(kind, key) for key in keys],
+                many=True,
+            )
+
+    def expire(self, kind, before):
+        """Deletes the records of the given kind older than before."""
+
+        self._execute('DELETE FROM %s WHERE kind=? AND time<?' %
+                      self._db.table, (kind, before))
+
+    def _execute(self, sql, parameters, fetch=False, many=False):
+        """
+        Runs the statement in a connection of its own, creating the
+        table first if needed. Errors are logged rather than raised, as
+        losing a record only means that some work gets redone.
+        """
+
+        with self._lock:
+            try:
+                connection = sqlite3.connect(self._db.path,
+                                             isolation_level=None)
+                try:
+                    if not self._ready:
+                        connection.execute(
+                            'CREATE TABLE IF NOT EXISTS %s (kind text, '
+                            'key text, value text, time real, '
+                            'PRIMARY KEY (kind, key))' % self._db.table
+                        )
+                        connection.execute(
+                            'CREATE INDEX IF NOT EXISTS %s_time ON %s '
+                            '(kind, time)' % (self._db.table, self._db.table)
+                        )
+                        self._ready = True
+
+                    if many:
+                        connection.executemany(sql, parameters)
+                    else:
+                        cursor = connection.execute(sql, parameters)
+                        if fetch:
+                            return cursor.fetchall()
+                finally:
+                    connection.close()
+
+            except sqlite3.Error as exception:
+                self._logger.error("Unable to use %s store: %s",
+                                   self._db.table, exception)
+
+        return [] if fetch else None
@@ -22,12 +22,14 @@
 Basic manipulation and sanitization of input text
 """
 
+from collections import OrderedDict
+from itertools import islice
 import re
-from StringIO import StringIO
 
-from BeautifulSoup import BeautifulSoup
 import anki
 
+from .markup import inner_html, without
+
 __all__ = ['RE_CLOZE_BRACED', 'RE_CLOZE_RENDERED', 'RE_ELLIPSES',
            'RE_ELLIPSES_LEADING', 'RE_ELLIPSES_TRAILING', 'RE_FILENAMES',
            'RE_HINT_LINK', 'RE_LINEBREAK_HTML', 'RE_NEWLINEISH', 'RE_SOUNDS',
@@ -58,75 +60,192 @@ STRIP_HTML = anki.utils.stripHTML  # this also converts character entities
 
 
 class Sanitizer(object):  # call only, pylint:disable=too-few-public-methods
-    """Once instantiated, provides a callable to sanitize text."""
+    """
+    Once instantiated, provides a callable to sanitize text.
+
+    The rules are compiled into a flat list of callables up front and
+    again whenever one of the configuration keys that they depend on is
+    updated, so that rules switched off by configuration cost nothing.
+
+    Recent results are remembered in a bounded LRU cache, which is
+    emptied whenever the rules are recompiled, so sanitizing the same
+    text again is just a lookup.
+    """
+
+    BATCH_CHUNK = 256  # texts run through each rule together by batch()
+
+    CACHE_SIZE = 500  # number of recent results remembered per instance
 
     # _rule_xxx() methods are in-class for getattr, pylint:disable=no-self-use
 
     __slots__ = [
-        '_config',  # dict-like interface for looking up config conditionals
-        '_logger',  # logger-like interface for debugging the Sanitizer
-        '_rules',   # list of rules that this instance's callable will process
+        '_cache',     # OrderedDict of recent results, least recent first
+        '_config',    # dict-like interface for looking up config values
+        '_hits',      # number of calls answered from the cache
+        '_logger',    # logger-like interface for debugging, if one is active
+        '_misses',    # number of calls that had to run through the rules
+        '_pipeline',  # list of (description, callable) tuples from the rules
+        '_rules',     # list of rules that this instance will compile
     ]
 
     def __init__(self, rules, config=None, logger=None):
         self._rules = rules
         self._config = config
-        self._logger = logger
+        self._logger = (logger if logger and
+                        not getattr(logger, 'disabled', False)
+                        else None)
+        self._pipeline = None
+        self._cache = OrderedDict()
+        self._hits = self._misses = 0
+        self._compile()
+
+        keys = self.get_keys()
+        if keys:
+            config.bind(list(keys), lambda config: self._compile())
 
     def __call__(self, text):
         """Apply the initialized rules against the text and return."""
 
+        cache = self._cache
+
+        try:
+            result = cache.pop(text)
+
+        except KeyError:
+            self._misses += 1
+            result = self._process(text)
+            if len(cache) >= self.CACHE_SIZE:
+                cache.popitem(last=False)
+
+        else:
+            self._hits += 1
+            if self._logger:
+                self._log("cache (%d hits, %d misses)" % (self._hits,
+                                                          self._misses),
+                          result)
+
+        cache[text] = result  # (re)inserted as the most recently used
+        return result
+
+    def batch(self, texts):
+        """
+        Sanitizes each of the given texts, yielding the results in the
+        same order. The rules in effect when the first result is asked
+        for are used for the whole batch, and each rule is applied to a
+        chunk of texts at a time. The results cache is bypassed, so that
+        a big batch does not push out the entries of interactive use.
+        """
+
+        pipeline = self._pipeline
+        texts = iter(texts)
+        total = 0
+
+        while True:
+            chunk = list(islice(texts, self.BATCH_CHUNK))
+            if not chunk:
+                break
+
+            for _, method in pipeline:
+                chunk = [method(text) if text else '' for text in chunk]
+
+            total += len(chunk)
+            for text in chunk:
+                yield text
+
+        if self._logger:
+            self._logger.debug("Transformed batch of %d text(s) using %s",
+                               total, [description
+                                       for description, _ in pipeline])
+
+    def get_stats(self):
+        """Returns a dict describing the usage of the results cache."""
+
+        return dict(hits=self._hits, misses=self._misses,
+                    size=len(self._cache))
+
+    def _process(self, text):
+        """Runs the compiled rules against the text."""
+
+        if not self._logger:
+            for _, method in self._pipeline:
+                if not text:
+                    return ''
+                text = method(text)
+            return text
+
         applied = []
 
-        for rule in self._rules:
+        for description, method in self._pipeline:
             if not text:
                 self._log(applied + ["early exit"], '')
                 return ''
 
+            applied.append(description)
+            text = method(text)
+
+        self._log(applied, text)
+        return text
+
+    def _compile(self):
+        """
+        Builds the list of (description, callable) tuples for the rules
+        that are in effect given the current configuration.
+        """
+
+        pipeline = []
+
+        for rule in self._rules:
             if isinstance(rule, basestring):  # always run these rules
-                applied.append(rule)
-                text = getattr(self, '_rule_' + rule)(text)
+                pipeline.append((rule, getattr(self, '_rule_' + rule)))
 
             elif isinstance(rule, tuple):  # rule that depends on config
-                try:
-                    addl = rule[2]
-                except IndexError:
-                    addl = None
+                method = getattr(self, '_rule_' + rule[0])
                 key = rule[1]
-                rule = rule[0]
 
                 # if the "key" is actually a list, then we will return True
                 # for `value` if ANY key in the list yields a truthy config
                 value = (next((True for k in key if self._config[k]),
                               False) if isinstance(key, list)
                          else self._config[key])
+                if not value:
+                    continue
 
-                if value is True:  # basic on/off config flag
-                    if addl:
-                        addl = self._config[addl]
-                        applied.append((rule, addl))
-                        text = getattr(self, '_rule_' + rule)(text, addl)
+                args = ([] if value is True  # basic on/off config flag
+                        else [value])  # some other truthy value for the rule
+                if len(rule) > 2:
+                    args.append(self._config[rule[2]])
 
-                    else:
-                        applied.append(rule)
-                        text = getattr(self, '_rule_' + rule)(text)
+                description = (rule[0],) + tuple(args) if args else rule[0]
+                prepare = getattr(method, 'prepare', None)
+                if prepare:  # e.g. rule whose config value is set up once
+                    args[0] = prepare(args[0])
 
-                elif value:  # some other truthy value that drives the rule
-                    if addl:
-                        addl = self._config[addl]
-                        applied.append((rule, value, addl))
-                        text = getattr(self, '_rule_' + rule)(text, value,
-                                                              addl)
-
-                    else:
-                        applied.append((rule, value))
-                        text = getattr(self, '_rule_' + rule)(text, value)
+                pipeline.append((
+                    description,
+                    _bind(method, args) if args else method,
+                ))
 
             else:
                 raise AssertionError("bad rule given to Sanitizer instance")
 
-        self._log(applied, text)
-        return text
+        self._pipeline = _fuse_within(pipeline)
+        self._cache.clear()
+
+    def get_keys(self):
+        """
+        Returns the set of configuration keys that can influence the
+        output of this instance, e.g. for invalidating cached results.
+        """
+
+        keys = set()
+
+        for rule in self._rules:
+            if isinstance(rule, tuple):
+                keys.update(rule[1] if isinstance(rule[1], list)
+                            else [rule[1]])
+                keys.update(rule[2:])
+
+        return keys
 
     def _log(self, method, result):
         """If we have a logger, send debug line for transformation."""
@@ -209,15 +328,8 @@ class Sanitizer(object):  # call only, pylint:disable=too-few-public-methods
         contents of that span.
         """
 
-        revealed_tags = BeautifulSoup(text)('span', attrs={'class': 'cloze'})
-
-        return ' ... '.join(
-            ''.join(
-                unicode(content)
-                for content in tag.contents
-            )
-            for tag in revealed_tags
-        ) if revealed_tags else text
+        revealed = inner_html(text, 'span', {'class': 'cloze'})
+        return ' ... '.join(revealed) if revealed else text
 
     def _rule_counter(self, text, characters, wrap):
         """
@@ -243,19 +355,15 @@ class Sanitizer(object):  # call only, pylint:disable=too-few-public-methods
         """
         Upon encountering text that matches one of the user's compiled
         rules, make a replacement. Run whitespace and ellipsis rules
-        before each one.
+        before each one (or, in practice, whenever the text has changed
+        since they were last run).
         """
 
-        for rule in rules:
-            text = self._rule_whitespace(self._rule_ellipses(text))
-            if not text:
-                return ''
-
-            text = rule['compiled'].sub(rule['replace'], text)
-            if not text:
-                return ''
+        return rules(text, lambda text: self._rule_whitespace(
+            self._rule_ellipses(text)
+        ))
 
-        return text
+    _rule_custom_sub.prepare = lambda rules: _Substitutions(rules)
 
     def _rule_ellipses(self, text):
         """
@@ -282,12 +390,7 @@ class Sanitizer(object):  # call only, pylint:disable=too-few-public-methods
         Removes hint content from the use of a {{hint:xxx}} field.
         """
 
-        soup = BeautifulSoup(text)
-        hints = soup.findAll('div', attrs={'class': 'hint'})
-        while hints:
-            hints.pop().extract()
-
-        return unicode(soup)
+        return without(text, 'div', {'class': 'hint'})
 
     def _rule_hint_links(self, text):
         """
@@ -355,54 +458,261 @@ class Sanitizer(object):  # call only, pylint:disable=too-few-public-methods
 
     def _rule_within_braces(self, text):
         """Removes text within curly braces."""
-        return _aux_within(text, '{', '}')
+        return _aux_within(text, _WITHIN['within_braces'])
 
     def _rule_within_brackets(self, text):
         """Removes text within square brackets."""
-        return _aux_within(text, '[', ']')
+        return _aux_within(text, _WITHIN['within_brackets'])
 
     def _rule_within_parens(self, text):
         """Removes text within parentheses."""
-        return _aux_within(text, '(', ')')
+        return _aux_within(text, _WITHIN['within_parens'])
 
 
-def _aux_within(text, begin_char, end_char):
+class _Substitutions(object):  # call only, pylint:disable=R0903
     """
-    Removes any substring of text that starts with begin_char and
-    ends with end_char.
+    Applies a list of the user's substitution rules to text, giving the
+    same result as running each rule in turn on normalized text.
+
+    Runs of consecutive rules that share flags are screened together by
+    a combined pattern (with the plain text rules folded into a trie),
+    so a run in which nothing matches costs one scan of the text rather
+    than one per rule. Normalizing is skipped while the text is known
+    not to have changed since it was last normalized.
     """
 
-    changed = False
-    result = StringIO()
-    sequences = []
+    RUN_SIZE = 32  # most rules screened together by one combined pattern
 
-    for char in text:
-        if char == begin_char:  # begins new level of text to possibly cut
-            sequence = StringIO()
-            sequence.write(char)
-            sequences.append(sequence)
+    __slots__ = [
+        '_runs',  # list of (screen, rules); screen is a regex or None
+    ]
 
-        elif char == end_char:
-            if sequences:  # match the last opening char and cut this text
-                changed = True
-                sequences.pop().close()
+    def __init__(self, rules):
+        runs = []
 
-            else:  # include closing chars w/o matching opening in result
-                result.write(char)
+        for rule in rules:
+            flags = _screen_flags(rule)
+            if flags is not None and runs and runs[-1][0] == flags and \
+               len(runs[-1][1]) < self.RUN_SIZE:
+                runs[-1][1].append(rule)
+            else:
+                runs.append((flags, [rule]))
 
-        elif sequences:  # write regular chars to current sequence level
-            sequences[-1].write(char)
+        self._runs = [(_screen(rules, flags) if len(rules) > 1 else None,
+                       rules)
+                      for flags, rules in runs]
+
+    def __call__(self, text, normalize):
+        """
+        Returns text with the rules applied, calling normalize on the
+        text before any rule sees it.
+        """
 
-        else:  # write top-level regular chars to the result
-            result.write(char)
+        dirty = True  # whether text may differ from its normalized form
+
+        for screen, rules in self._runs:
+            if dirty:
+                text = normalize(text)
+                if not text:
+                    return ''
+                dirty = False
+
+            if screen and not screen(text):
+                continue
+
+            for rule in rules:
+                if dirty:
+                    text = normalize(text)
+                    if not text:
+                        return ''
+                    dirty = False
+
+                text, count = rule['compiled'].subn(rule['replace'], text)
+                if count:
+                    if not text:
+                        return ''
+                    dirty = True
+
+        return text
+
+
+def _screen_flags(rule):
+    """
+    Returns the regex flags of the rule if its pattern can be combined
+    with others in an alternation, or None if it cannot (i.e. patterns
+    with backreferences, named groups, or inline flags).
+    """
+
+    compiled = rule['compiled']
+
+    if rule['regex'] and (compiled.groupindex or
+                          _screen_flags.RE_UNSAFE.search(compiled.pattern)):
+        return None
+
+    return compiled.flags
+
+_screen_flags.RE_UNSAFE = re.compile(r'\\[1-9]|\(\?([iLmsux(]|P=)')
+
+
+def _screen(rules, flags):
+    """
+    Returns the search method of a combined pattern that matches
+    wherever any of the given rules would, or None if one cannot be
+    compiled.
+    """
+
+    literals = [rule['input'] for rule in rules if not rule['regex']]
+    alternatives = [_trie(literals)] if literals else []
+    alternatives.extend('(?:%s)' % rule['compiled'].pattern
+                        for rule in rules if rule['regex'])
+
+    try:
+        return re.compile('|'.join(alternatives), flags).search
+    except Exception:  # e.g. too deeply nested, pylint:disable=broad-except
+        return None
+
+
+def _trie(literals):
+    """
+    Returns a pattern matching any of the literal strings, with common
+    prefixes factored out so that the regex engine need not try every
+    string at every position.
+    """
+
+    root = {}
+    for literal in literals:
+        node = root
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = None  # marks the end of a literal
+
+    def build(node):
+        """Returns the pattern for the subtree below node."""
+
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+
+        if not branches:
+            return ''
+        elif '' in node:  # a literal ends here, so the rest is optional
+            return '(?:%s)?' % '|'.join(branches)
+        elif len(branches) == 1:
+            return branches[0]
+        return '(?:%s)' % '|'.join(branches)
+
+    return build(root)
+
+
+def _bind(method, args):
+    """Returns a callable passing the text and given args to method."""
+
+    return lambda text: method(text, *args)
+
+
+def _fuse_within(pipeline):
+    """
+    Replaces adjacent within_xxx rules in the pipeline with a single
+    step that strips all of their pairs in one scan of the text.
+    """
+
+    fused = []
+    fused_pairs = None  # pairs stripped by the last step in fused, if any
+
+    for description, method in pipeline:
+        pairs = (_WITHIN.get(description)
+                 if isinstance(description, basestring) else None)
+
+        if not pairs:
+            fused.append((description, method))
+            fused_pairs = None
+            continue
+
+        if fused_pairs:
+            description = fused.pop()[0] + '+' + description
+            pairs = fused_pairs + pairs
+
+        fused.append((description, _bind(_aux_within, [pairs])))
+        fused_pairs = pairs
+
+    return fused
+
+
+_WITHIN = {
+    'within_braces': (('{', '}'),),
+    'within_brackets': (('[', ']'),),
+    'within_parens': (('(', ')'),),
+}
+
+
+def _aux_within(text, pairs):
+    """
+    Removes any substring of text that starts with an opening character
+    and ends with the matching closing character, for each of the given
+    (opening, closing) pairs.
+
+    The effect is the same as stripping each pair from the text in turn
+    (i.e. nested substrings go with the outermost one, closing characters
+    lacking an opening character are kept, and so is the text following
+    an opening character that is never closed), but the text itself is
+    scanned just once, for the positions of all of the delimiters.
+    """
+
+    try:
+        finder = _aux_within.finders[pairs]
+    except KeyError:
+        finder = _aux_within.finders[pairs] = re.compile(
+            '[' + re.escape(''.join(''.join(pair) for pair in pairs)) + ']'
+        ).finditer
+
+    delimiters = [(match.start(), match.group()) for match in finder(text)]
+    if not delimiters:
+        return text
+
+    removed = []  # (start, stop) spans to remove, from any of the pairs
+
+    for begin_char, end_char in pairs:
+        openings = []  # positions of the opening chars not yet closed
+        spans = []  # outermost (start, stop) spans closed for this pair
+
+        for position, char in delimiters:
+            if char == begin_char:
+                openings.append(position)
+
+            elif char == end_char and openings:
+                start = openings.pop()
+                while spans and spans[-1][0] > start:  # nested in this one
+                    spans.pop()
+                spans.append((start, position + 1))
+
+        if not spans:
+            continue
+
+        # the remaining pairs only see the delimiters that survive this one
+        surviving = []
+        spans_iter = iter(spans)
+        start, stop = next(spans_iter)
+        for position, char in delimiters:
+            while position >= stop:
+                start, stop = next(spans_iter, (len(text), len(text) + 1))
+            if position < start:
+                surviving.append((position, char))
+        delimiters = surviving
+
+        removed.extend(spans)
+
+    if not removed:
+        return text
 
-    if changed:  # replace passed text object with the buffer
-        for sequence in sequences:  # include stuff lacking a closing char
-            result.write(sequence.getvalue())
-        text = result.getvalue()
+    removed.sort()
+    chunks = []
+    position = 0
+    for start, stop in removed:
+        if start > position:
+            chunks.append(text[position:start])
+        if stop > position:
+            position = stop
+    chunks.append(text[position:])
 
-    result.close()
-    while sequences:
-        sequences.pop().close()
+    return ''.join(chunks)
 
-    return text
+_aux_within.finders = {}  # regex finditer for each tuple of pairs
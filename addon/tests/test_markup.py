@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# AwesomeTTS text-to-speech add-on for Anki
+#
+# Copyright (C) 2016       Anki AwesomeTTS Development Team
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Regression corpus for the markup module
+
+Each fragment (and each fragment followed by the next one, so that
+unclosed elements run into other markup) must give the same results
+from the markup module's streaming path as from building BeautifulSoup
+3 trees, which is how clozes, hints, and <tts> tags used to be found.
+
+Run from the addon directory with BeautifulSoup 3 importable, e.g.:
+
+    python -m unittest discover tests
+"""
+
+import imp
+from os.path import abspath, dirname, join
+import unittest
+import warnings
+
+from BeautifulSoup import BeautifulSoup
+
+markup = imp.load_source(  # without the package, which needs Anki
+    'markup',
+    join(dirname(dirname(abspath(__file__))), 'awesometts', 'markup.py'),
+)
+
+
+class TTSSoup(BeautifulSoup):
+    """How <tts> tags were parsed, allowing them to nest."""
+
+    NESTABLE_TAGS = dict(BeautifulSoup.NESTABLE_TAGS.items() + [('tts', [])])
+
+
+CORPUS = [
+    # typical cards
+    u'<div class="front">What is <span class=cloze>[...]</span> in '
+    u'French?</div>',
+    u'What is <span class=cloze>cat</span> in French?<br><br>\n<a '
+    u'class=hint href="#" onclick="this.style.display=\'none\';document.'
+    u'getElementById(\'hint8\').style.display=\'block\';return false;">'
+    u'Hint</a><div id="hint8" class=hint style="display: none">chat</div>',
+    u'<tts service="google" voice="fr">le chat</tts><hr id=answer><tts '
+    u'service=yandex voice=ru>кошка &amp; собака</tts>',
+    u'<div>Front</div><tts service="say" voice="Alex" style="display: '
+    u'none">The <b>quick</b> brown fox&nbsp;jumps</tts>',
+    u'<span class="cloze foo">not a cloze</span><span class=\'cloze\'>'
+    u'<b>bold</b> cloze</span>',
+
+    # namespaced tags, e.g. as pasted from Word
+    u'<p class=MsoNormal>Hund<o:p></o:p></p>',
+    u'<span class=cloze>Katze<o:p>&nbsp;</o:p></span>',
+    u'<tts service=x>&lt;</o:p> spoken</tts> not spoken',
+    u'<tts service=x><o:p>a</o:p>b</tts>',
+    u'<w:Sdt x=1><span class=cloze>x</span></w:sdt>',
+    u'<st1:place><st1:City>Paris</st1:City></st1:place>',
+    u'<div class=hint><O:P>h</O:P></div>after',
+    u'<o:p/><a:b/>text</o:p>',
+
+    # entities and bare special characters
+    u'<span class=cloze>&amp; &lt; &gt; &quot; &#233; &#x41; &nbsp</span>',
+    u'<span class=cloze>AT&T a < b x > y & z</span>',
+    u'<span class=cloze data-x="&amp;&lt;&#65;&#233;&foo;&bar">e</span>',
+    u'<tts service=x voice="&quot;q&quot;">&foo; &#1234567; &</tts>',
+    u'<span title="a>b" class=cloze>t</span><span title=\'x"y\'>u</span>',
+
+    # unclosed and nested <tts> tags
+    u'<tts service=x>never closed',
+    u'<tts service=x>one<tts service=y>two',
+    u'<tts group="English"><tts preset="a">nested</tts> outer</tts>',
+    u'<tts preset=p><tts preset=q><tts preset=r>deep</tts></tts>',
+    u'</tts>stray close<tts service=x>a</tts></tts>',
+    u'<TTS SERVICE=yandex voice=ru>upper</TTS>',
+    u'<tts service=x><div class=hint>h</div><span class=cloze>c',
+
+    # other constructs that affect nesting and rendering
+    u'<table><tr><td><span class=cloze>cell</td></tr></table>',
+    u'<ul><li>one<li><span class=cloze>two</span></ul>',
+    u'<script>var a = "<span class=cloze>" < 3;</script>',
+    u'<textarea>x < y</textarea><pre>  </pre>',
+    u'<!-- <span class=cloze>commented</span> --><!---->',
+    u'<br/><br /><BR><img src="a.png"><hr id=answer>',
+    u'<span\nclass=cloze >multi\nline</span>',
+    u'< b></ ></>< 1><span',
+    u'[sound:a.mp3]{{c1::x}}<span class=cloze>[...]</span>',
+]
+
+
+class TestMarkup(unittest.TestCase):
+    """Compares the markup module against BeautifulSoup 3."""
+
+    def setUp(self):
+        warnings.simplefilter('ignore')  # e.g. BeautifulSoup's Unicode
+
+    def test_corpus(self):
+        """Checks each fragment alone and followed by the next one."""
+
+        for index, html in enumerate(CORPUS):
+            for variant in [html, html + CORPUS[(index + 1) % len(CORPUS)]]:
+                self._check(variant)
+
+    def _check(self, html):
+        """Compares the three lookups for the given HTML."""
+
+        self.assertEqual(
+            markup.inner_html(html, 'span', {'class': 'cloze'}),
+            [''.join(unicode(content) for content in tag.contents)
+             for tag in BeautifulSoup(html)('span', attrs={'class': 'cloze'})],
+            html,
+        )
+
+        soup = BeautifulSoup(html)
+        hints = soup.findAll('div', attrs={'class': 'hint'})
+        while hints:
+            hints.pop().extract()
+        self.assertEqual(markup.without(html, 'div', {'class': 'hint'}),
+                         unicode(soup), html)
+
+        self.assertEqual(
+            markup.outer_html(html, 'tts', nestable=True),
+            [(dict(tag.attrs), unicode(tag)) for tag in TTSSoup(html)('tts')],
+            html,
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()